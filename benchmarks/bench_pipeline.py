@@ -0,0 +1,271 @@
+"""
+Offline benchmark for the Cow-Says Daily News pipeline.
+
+Replays the recorded NewsAPI response in fixtures/ (grown to the requested number of articles)
+through NEWS_CACHE_MODE=replay, and swaps Gemini, the Ghost Admin API and the news sites behind
+the links for the local stand-ins in stubs.py, so a run needs no network and no API keys. Each
+size runs the whole pipeline (fetch, filter, classify, links, title, render, publish) with fresh,
+empty caches and reports the per-stage and end-to-end times.
+
+Usage:
+    python benchmarks/bench_pipeline.py                     # 32, 500 and 5000 articles, checked against baseline.json
+    python benchmarks/bench_pipeline.py --save-baseline     # store this run as the new baseline
+    python benchmarks/bench_pipeline.py --sizes 32 --llm-latency 0.5 --llm-error-rate 0.1
+    python benchmarks/bench_pipeline.py --record            # refresh the fixture from NewsAPI (needs NEWS_API_KEY)
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import requests
+
+import stubs
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_PATH = os.path.join(BENCH_DIR, os.pardir, "cowsays-daily-news.py")
+FIXTURE_PATH = os.path.join(BENCH_DIR, "fixtures", "top-headlines-us.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+STAGES = ("fetch", "filter", "classify", "links", "title", "render", "publish")
+# Stages the pipeline books separately but which all belong to publishing
+STAGE_ALIASES = {"ghost_newsletters": "publish", "draft": "publish"}
+
+# --- Fixtures ---
+
+def record_fixture(path):
+    """
+    Saves a live top-headlines response as the fixture. The only part of the benchmark that uses the network.
+    """
+    response = requests.get(
+        "https://newsapi.org/v2/top-headlines",
+        params={'country': "us", 'pageSize': 100},
+        headers={'X-Api-Key': os.environ["NEWS_API_KEY"]},
+        timeout=15
+    )
+    response.raise_for_status()
+    with open(path, "w", encoding="utf-8") as fixture_file:
+        json.dump(response.json(), fixture_file, indent=2)
+    print(f"Recorded {len(response.json().get('articles', []))} articles to {path}")
+
+def grow_articles(articles, size, seed=0):
+    """
+    Returns `size` articles: the recorded ones first, then synthetic ones whose headlines are
+    shuffled from the recorded vocabulary (so they are distinct stories, not near-duplicates)
+    and whose sources and links follow the recorded ones.
+    """
+    rnd = random.Random(seed)
+    vocabulary = sorted({
+        word for article in articles for word in article['title'].rsplit(" - ", 1)[0].split() if len(word) > 2
+    })
+    grown = [dict(article) for article in articles[:size]]
+    for i in range(len(grown), size):
+        base = articles[i % len(articles)]
+        headline = " ".join(rnd.sample(vocabulary, 8)).capitalize()
+        grown.append(dict(
+            base,
+            title=f"{headline} - {base['source']['name']}",
+            url=f"{base['url'].rstrip('/')}-{i}",
+            publishedAt=f"2026-10-16T{i % 24:02d}:{i % 60:02d}:00Z"
+        ))
+    return grown
+
+# --- Running the pipeline ---
+
+def load_pipeline(name, env):
+    """
+    Imports a fresh copy of the pipeline script with `env` applied, so every run starts with
+    its own settings, caches and metrics.
+    """
+    os.environ.update(env)
+    spec = importlib.util.spec_from_file_location(name, SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def run_once(size, fixture, options, run_number):
+    with tempfile.TemporaryDirectory(prefix="cowsays-bench-") as work_dir:
+        env = {
+            'NEWS_API_KEY': "benchmark", 'GEMINI_API_KEY': "benchmark", 'GHOST_AUTHOR': "1",
+            'GHOST_URL': "https://ghost.benchmark.invalid", 'ADMIN_API_KEY': "bench:" + "00" * 32,
+            'NEWS_COUNTRY': "us", 'NEWS_CATEGORIES': "", 'NEWS_PAGES': "1", 'NEWS_PAGE_SIZE': str(size),
+            'NEWS_CACHE_MODE': "replay", 'NEWS_CACHE_DIR': os.path.join(work_dir, "newsapi"),
+            'CLASSIFY_CACHE_PATH': os.path.join(work_dir, "classifications.sqlite3"),
+            'LABEL_LOG_PATH': os.path.join(work_dir, "labels.jsonl"),
+            'ARCHIVE_PATH': os.path.join(work_dir, "archive.sqlite3"),
+            'RUN_STATE_DIR': os.path.join(work_dir, "runs"),
+            'GHOST_NEWSLETTER_CACHE_PATH': os.path.join(work_dir, "ghost-newsletter.json"),
+            'GHOST_PUBLISH_MODE': options.publish_mode, 'EDITIONS_CONFIG_PATH': "",
+            'RUN_REPORT_PATH': "", 'METRICS_TEXTFILE_PATH': "",
+            'GEMINI_REQUESTS_PER_SECOND': str(options.gemini_rps), 'GEMINI_BURST': str(options.gemini_burst),
+            'LINK_CHECK': options.link_check, 'LINK_CACHE_PATH': os.path.join(work_dir, "links.sqlite3"),
+        }
+        pipeline = load_pipeline(f"cowsays_bench_{size}_{run_number}", env)
+
+        # Put the fixture where replay mode will look for it
+        params = {'country': "us", 'pageSize': size, 'page': 1}
+        articles = grow_articles(fixture['articles'], size)
+        for article in articles:
+            # Plain http, so the link checker can be sent through the local stand-in as a proxy
+            article['url'] = "http://" + article['url'].split("://", 1)[-1]
+        data = dict(fixture, totalResults=size, articles=articles)
+        pipeline.store_cached_response(params, {'fetched_at': time.time(), 'etag': None, 'last_modified': None, 'data': data})
+
+        llm = stubs.ServiceModel(options.llm_latency, options.jitter, options.llm_error_rate, seed=run_number, token_latency=options.llm_token_latency)
+        ghost_service = stubs.ServiceModel(options.ghost_latency, options.jitter, options.ghost_error_rate, seed=run_number)
+        gemini_client = stubs.StubGeminiClient(llm, pipeline.valid_categories)
+        ghost_client = pipeline.GhostAdminClient(os.environ['GHOST_URL'], os.environ['ADMIN_API_KEY'])
+        ghost_client.session = stubs.StubGhostSession(ghost_service)
+        pipeline.get_client = lambda: gemini_client
+        pipeline.get_ghost_client = lambda: ghost_client
+        link_service = stubs.ServiceModel(options.link_latency, options.jitter, seed=run_number)
+        link_server = stubs.LinkServer(link_service, options.dead_link_rate, options.redirect_rate)
+        pipeline.get_link_session().proxies.update({'http': link_server.url})
+
+        # Build the Gemini configs up front so the one-off google-genai import isn't timed
+        pipeline.get_classify_batch_config()
+
+        args = argparse.Namespace(dry_run=False, output=None, resume=False, editions=None)
+        output = sys.stdout if options.verbose else open(os.devnull, "w")
+        with link_server:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(output):
+                exit_code = pipeline.run_pipeline(args)
+                pipeline.run_metrics.end()
+            total = time.perf_counter() - started
+        if output is not sys.stdout:
+            output.close()
+
+        report = pipeline.run_metrics.report()
+        stages = dict.fromkeys(STAGES, 0.0)
+        for stage, stats in report['stages'].items():
+            stage = STAGE_ALIASES.get(stage, stage)
+            stages[stage] = stages.get(stage, 0.0) + stats['seconds']
+        return {
+            'stages': stages,
+            'total': total,
+            'exit_code': exit_code,
+            'llm_calls': llm.calls,
+            'ghost_calls': ghost_service.calls,
+            'link_checks': link_service.calls,
+            'prompt_tokens': report['totals']['prompt_tokens'],
+        }
+
+def run_size(size, fixture, options):
+    """
+    Runs one size `options.repeat` times and keeps the median of every timing.
+    """
+    runs = [run_once(size, fixture, options, run_number) for run_number in range(options.repeat)]
+    failed = [run['exit_code'] for run in runs if run['exit_code']]
+    if failed:
+        print(f"Warning: {len(failed)} of {len(runs)} runs at {size} articles exited non-zero.")
+    return {
+        'stages': {stage: statistics.median(run['stages'][stage] for run in runs) for stage in runs[0]['stages']},
+        'total': statistics.median(run['total'] for run in runs),
+        'llm_calls': statistics.median(run['llm_calls'] for run in runs),
+        'ghost_calls': statistics.median(run['ghost_calls'] for run in runs),
+        'prompt_tokens': statistics.median(run['prompt_tokens'] for run in runs),
+    }
+
+# --- Reporting ---
+
+def print_table(results):
+    stages = list(dict.fromkeys(stage for result in results.values() for stage in result['stages']))
+    print(f"{'articles':>8}  " + "  ".join(f"{stage:>9}" for stage in stages)
+          + f"  {'total':>9}  {'llm calls':>9}  {'prompt tok':>10}")
+    for size, result in results.items():
+        cells = "  ".join(f"{result['stages'].get(stage, 0.0):9.3f}" for stage in stages)
+        print(f"{size:>8}  {cells}  {result['total']:9.3f}  {result['llm_calls']:9g}"
+              f"  {result.get('prompt_tokens', 0):10g}")
+
+def find_regressions(results, baseline, tolerance, min_delta):
+    """
+    Lists every timing that is more than `tolerance` (a fraction) and `min_delta` seconds slower than the baseline.
+    """
+    regressions = []
+    for size, result in results.items():
+        previous = baseline['results'].get(size)
+        if previous is None:
+            continue
+        timings = dict(result['stages'], total=result['total'])
+        previous_timings = dict(previous['stages'], total=previous['total'])
+        for name, seconds in timings.items():
+            before = previous_timings.get(name)
+            if before is not None and seconds - before > min_delta and seconds > before * (1 + tolerance):
+                regressions.append(f"{size} articles, {name}: {before:.3f}s -> {seconds:.3f}s (+{(seconds / before - 1) * 100 if before else float('inf'):.0f}%)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline against recorded NewsAPI data and stub services.")
+    parser.add_argument("--sizes", default="32,500,5000", help="Comma-separated article counts (default: 32,500,5000).")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per size; the median is reported (default: 1).")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per Gemini call (default: 0.05).")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of Gemini calls that fail (default: 0).")
+    parser.add_argument("--llm-token-latency", type=float, default=0.01, help="Extra seconds per 1,000 prompt tokens (default: 0.01).")
+    parser.add_argument("--ghost-latency", type=float, default=0.02, help="Seconds per Ghost Admin API call (default: 0.02).")
+    parser.add_argument("--ghost-error-rate", type=float, default=0.0, help="Fraction of Ghost calls that fail (default: 0).")
+    parser.add_argument("--link-latency", type=float, default=0.05, help="Seconds per link check request (default: 0.05).")
+    parser.add_argument("--dead-link-rate", type=float, default=0.05, help="Fraction of links that are dead (default: 0.05).")
+    parser.add_argument("--redirect-rate", type=float, default=0.3, help="Fraction of links that redirect (default: 0.3).")
+    parser.add_argument("--link-check", default="on", choices=("on", "off"), help="LINK_CHECK for the run (default: on).")
+    parser.add_argument("--jitter", type=float, default=0.25, help="Latency varies by up to this fraction either way (default: 0.25).")
+    parser.add_argument("--gemini-rps", type=float, default=1000, help="GEMINI_REQUESTS_PER_SECOND for the run (default: 1000, i.e. unthrottled).")
+    parser.add_argument("--gemini-burst", type=int, default=1000, help="GEMINI_BURST for the run (default: 1000).")
+    parser.add_argument("--publish-mode", default="draft", choices=("direct", "draft"), help="GHOST_PUBLISH_MODE for the run.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file to compare against or save to.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline instead of comparing.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Flag timings this fraction slower than the baseline (default: 0.25).")
+    parser.add_argument("--min-delta", type=float, default=0.01, help="Ignore slowdowns smaller than this many seconds (default: 0.01).")
+    parser.add_argument("--record", action="store_true", help="Refresh the NewsAPI fixture from the live API and exit.")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output.")
+    options = parser.parse_args(argv)
+
+    if options.record:
+        record_fixture(FIXTURE_PATH)
+        return 0
+
+    with open(FIXTURE_PATH, encoding="utf-8") as fixture_file:
+        fixture = json.load(fixture_file)
+    settings = {name: getattr(options, name) for name in (
+        "llm_latency", "llm_error_rate", "llm_token_latency",
+        "ghost_latency", "ghost_error_rate", "link_latency", "dead_link_rate", "redirect_rate", "link_check", "jitter", "gemini_rps", "gemini_burst", "publish_mode"
+    )}
+
+    results = {}
+    for size in [int(size) for size in options.sizes.split(",")]:
+        print(f"Benchmarking {size} articles...")
+        results[str(size)] = run_size(size, fixture, options)
+    print_table(results)
+
+    if options.save_baseline:
+        with open(options.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump({'settings': settings, 'python': sys.version.split()[0], 'results': results}, baseline_file, indent=2)
+        print(f"Baseline saved to {options.baseline}")
+        return 0
+
+    try:
+        with open(options.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+    except OSError:
+        print(f"No baseline at {options.baseline}; run with --save-baseline to create one.")
+        return 0
+    if baseline.get('settings') != settings:
+        print("Warning: the baseline was recorded with different stub settings, so the comparison may not mean much.")
+
+    regressions = find_regressions(results, baseline, options.tolerance, options.min_delta)
+    if regressions:
+        print(f"Regressions against {options.baseline}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"No regressions against {options.baseline}.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Local stand-ins for the services the pipeline talks to, used by the benchmark.
+Each one answers in the shape the real API does, after a configurable delay, and fails a
+configurable fraction of calls so retry and fallback paths get exercised too.
+"""
+import datetime
+import http.server
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import zlib
+
+import requests
+
+
+class ServiceModel:
+    """
+    Latency and error injection shared by the stubs. Every call sleeps for `latency` seconds
+    plus `token_latency` per 1,000 input tokens it has to process (all of it plus or minus
+    `jitter`), and fails with probability `error_rate`.
+    """
+    def __init__(self, latency=0.0, jitter=0.25, error_rate=0.0, seed=0, token_latency=0.0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def call(self, tokens=0):
+        """
+        Waits out one call's latency. Returns True if this call should fail.
+        """
+        with self.lock:
+            self.calls += 1
+            delay = (self.latency + self.token_latency * tokens / 1000) * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if delay > 0:
+            time.sleep(delay)
+        return failed
+
+
+# --- Gemini ---
+
+def count_tokens(text):
+    # Roughly four characters per token, close enough for comparing runs
+    return len(text or "") // 4
+
+
+class StubUsage:
+    def __init__(self, prompt_tokens, text):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = count_tokens(text)
+        self.cached_content_token_count = 0
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class StubGenerateResponse:
+    def __init__(self, prompt_tokens, text):
+        self.text = text
+        self.usage_metadata = StubUsage(prompt_tokens, text)
+
+
+class StubModels:
+    """
+    Stands in for client.models. Classifications and impact scores are derived from a hash of
+    the headline, so the same headline always gets the same answer.
+    """
+    BATCH_LINE = re.compile(r'^\s*(\d+)\. "(.*)"\s*$', re.M)
+    SINGLE_LINE = re.compile(r'^\s*Headline: "(.*)"\s*$', re.M)
+    TITLE_PREFIX = re.compile(r"'(\w+ Edition:)'")
+
+    def __init__(self, service, categories):
+        self.service = service
+        self.categories = list(categories) + ["Other"]
+
+    def category(self, headline):
+        return self.categories[zlib.crc32(headline.encode("utf-8")) % len(self.categories)]
+
+    def impact(self, headline):
+        return zlib.adler32(headline.encode("utf-8")) % 5 + 1
+
+    def generate_content(self, model, contents, config=None):
+        # The system instruction is billed as input like the rest of the prompt
+        prompt_tokens = count_tokens(contents) + count_tokens(getattr(config, 'system_instruction', None))
+        if self.service.call(tokens=prompt_tokens):
+            raise RuntimeError("Injected Gemini error (503 UNAVAILABLE)")
+
+        if getattr(config, 'response_mime_type', None) == "application/json":
+            text = json.dumps([
+                {"index": int(index), "category": self.category(headline), "impact": self.impact(headline)}
+                for index, headline in self.BATCH_LINE.findall(contents)
+            ])
+        elif self.SINGLE_LINE.search(contents):
+            text = self.category(self.SINGLE_LINE.search(contents).group(1))
+        else:
+            prefix = self.TITLE_PREFIX.search(contents)
+            text = f'"{prefix.group(1) if prefix else "Daily Edition:"} Udderly Benchmarked"'
+        return StubGenerateResponse(prompt_tokens, text)
+
+
+class StubGeminiClient:
+    """
+    Stands in for google.genai.Client.
+    """
+    def __init__(self, service, categories):
+        self.models = StubModels(service, categories)
+
+
+# --- Ghost Admin API ---
+
+def json_response(status_code, payload, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload).encode("utf-8")
+    response.headers.update({'Content-Type': 'application/json'})
+    response.headers.update(headers or {})
+    return response
+
+
+class StubGhostSession:
+    """
+    Stands in for the requests.Session inside GhostAdminClient, keeping posts in memory.
+    Injected failures are 503s, or 429s for POSTs (which the client only retries on a 429).
+    Both carry "Retry-After: 0" so the benchmark measures the retries, not the backoff.
+    """
+    def __init__(self, service):
+        self.service = service
+        self.posts = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def request(self, method, url, headers=None, timeout=None, params=None, json=None):
+        if self.service.call():
+            status = 429 if method == "POST" else 503
+            return json_response(status, {'errors': [{'message': "Injected error"}]}, {'Retry-After': "0"})
+
+        path = url.split("/ghost/api/admin", 1)[-1]
+        now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        with self.lock:
+            if method == "GET" and path == "/newsletters/":
+                return json_response(200, {'newsletters': [{'slug': "benchmark", 'status': "active"}]})
+            if method == "GET" and path == "/posts/":
+                return json_response(200, {'posts': list(self.posts.values())})
+            if method == "POST" and path == "/posts/":
+                post = dict(json['posts'][0], id=f"bench{next(self.ids)}", updated_at=now)
+                post['url'] = f"https://ghost.benchmark.invalid/{post['id']}/"
+                if post.get('status') == 'published':
+                    post['email'] = {'status': "submitted", 'recipient_count': 0}
+                self.posts[post['id']] = post
+                return json_response(201, {'posts': [post]})
+
+            match = re.fullmatch(r"/posts/([^/]+)/", path)
+            post = self.posts.get(match.group(1)) if match else None
+            if post is None:
+                return json_response(404, {'errors': [{'message': "Resource not found"}]})
+            if method == "GET":
+                return json_response(200, {'posts': [post]})
+            if method == "PUT":
+                changes = json['posts'][0]
+                if changes.get('updated_at') != post['updated_at']:
+                    return json_response(409, {'errors': [{'message': "Saving failed! Someone else is editing this post."}]})
+                post.update(changes, updated_at=now)
+                if post.get('status') == 'published':
+                    post['email'] = {'status': "submitted", 'recipient_count': 0}
+                return json_response(200, {'posts': [post]})
+        return json_response(405, {'errors': [{'message': f"{method} not supported by the stub"}]})
+
+
+# --- News sites ---
+
+class LinkServer:
+    """
+    A local HTTP proxy standing in for the news sites behind article links. Point the link
+    checker's session at it with proxies={'http': server.url} and give the articles http:// links.
+    Whether a link is dead (404) or redirects once (to a page with tracking parameters added)
+    is decided by a hash of the URL, so reruns agree. Injected failures are 503s.
+    """
+    def __init__(self, service, dead_rate=0.05, redirect_rate=0.3):
+        self.service = service
+        self.dead_rate = dead_rate
+        self.redirect_rate = redirect_rate
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                status, headers = stub.answer(self.path)
+                self.send_response(status)
+                for name, value in dict(headers, **{'Content-Length': "0"}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+
+            def do_GET(self):
+                self.do_HEAD()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def answer(self, url):
+        if self.service.call():
+            return 503, {}
+        if url.split("?", 1)[0].endswith("/landing"):
+            return 200, {}
+        bucket = zlib.crc32(url.encode("utf-8")) % 1000 / 1000
+        if bucket < self.dead_rate:
+            return 404, {}
+        if bucket < self.dead_rate + self.redirect_rate:
+            return 301, {'Location': f"{url.split('?', 1)[0].rstrip('/')}/landing?utm_source=newsletter&utm_medium=email"}
+        return 200, {}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -1,8 +1,10 @@
 ## All imports and API keys at the top ##
 #########################################
 
-from google import genai
-from google.genai import types
+import argparse
+import base64
+import binascii
+import functools
 import os
 import time
 import datetime
@@ -10,137 +12,561 @@ import requests
 import jwt
 import json
 import html
+import io
+import collections
+import email.utils
+import hashlib
+import heapq
+import math
+import random
+import re
+import sqlite3
+import string
+import threading
+import zlib
 import sys # Necessary for sys.exit()
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as futures_wait
+from urllib.parse import parse_qsl, unquote_plus, urlparse, urlunparse
+from urllib3.exceptions import NewConnectionError
+
+# --- Run metrics ---
+# Wall time, external calls, retries, bytes and Gemini token usage are tracked per pipeline stage.
+# A JSON report is written to RUN_REPORT_PATH at the end of every run (including failed ones), and a
+# Prometheus textfile to METRICS_TEXTFILE_PATH if set (e.g. for node_exporter's textfile collector).
+RUN_REPORT_PATH = os.environ.get("RUN_REPORT_PATH", "run-report.json")
+METRICS_TEXTFILE_PATH = os.environ.get("METRICS_TEXTFILE_PATH", "")
+
+class RunMetrics:
+    """
+    Per-stage counters for a single run. Stages run one after another, so anything recorded
+    (from any thread) without an explicit stage is booked against the stage currently open.
+    """
+    COUNTERS = ("calls", "retries", "cache_hits", "bytes", "prompt_tokens", "cached_tokens", "output_tokens")
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.stages = {}
+        self.current = None
+        self.stage_started = None
+        self.lock = threading.Lock()
+
+    def stats(self, stage):
+        return self.stages.setdefault(stage, dict({"seconds": 0.0}, **{counter: 0 for counter in self.COUNTERS}))
+
+    def begin(self, stage):
+        """
+        Closes the open stage (if any) and starts timing a new one.
+        """
+        self.end()
+        with self.lock:
+            self.stats(stage)
+        self.current = stage
+        self.stage_started = time.perf_counter()
+
+    def end(self):
+        if self.current is None:
+            return
+        with self.lock:
+            self.stats(self.current)['seconds'] += time.perf_counter() - self.stage_started
+        self.current = None
+
+    def record(self, stage=None, **counts):
+        with self.lock:
+            stats = self.stats(stage or self.current or "other")
+            for counter, value in counts.items():
+                stats[counter] += value
+
+    def record_http(self, response, stage=None):
+        self.record(stage, calls=1, bytes=len(response.content or b""))
+
+    def record_llm(self, response, stage=None):
+        """
+        Books one Gemini call plus the token counts from its usage metadata.
+        """
+        usage = getattr(response, 'usage_metadata', None)
+        self.record(
+            stage,
+            calls=1,
+            prompt_tokens=getattr(usage, 'prompt_token_count', None) or 0,
+            cached_tokens=getattr(usage, 'cached_content_token_count', None) or 0,
+            output_tokens=getattr(usage, 'candidates_token_count', None) or 0,
+        )
+
+    def report(self):
+        with self.lock:
+            stages = {name: dict(stats) for name, stats in self.stages.items()}
+        totals = {counter: sum(stats[counter] for stats in stages.values()) for counter in ("seconds",) + self.COUNTERS}
+        return {
+            "started_at": datetime.datetime.fromtimestamp(self.started_at, datetime.timezone.utc).isoformat(),
+            "duration_seconds": time.time() - self.started_at,
+            "stages": stages,
+            "totals": totals,
+        }
 
-# --- NewsAPI.org Config ---
-# Read API key from environment variable
-NEWS_API_KEY = os.environ.get("NEWS_API_KEY")
-if not NEWS_API_KEY:
-    raise ValueError("NEWS_API_KEY environment variable not set.")
+    def prometheus(self, report):
+        lines = [
+            "# HELP cowsays_run_timestamp_seconds Unix time the run started.",
+            "# TYPE cowsays_run_timestamp_seconds gauge",
+            f"cowsays_run_timestamp_seconds {self.started_at:.3f}",
+            "# HELP cowsays_run_duration_seconds Wall time of the whole run.",
+            "# TYPE cowsays_run_duration_seconds gauge",
+            f"cowsays_run_duration_seconds {report['duration_seconds']:.3f}",
+        ]
+        for counter in ("seconds",) + self.COUNTERS:
+            lines.append(f"# HELP cowsays_stage_{counter} Per-stage {counter.replace('_', ' ')} in the last run.")
+            lines.append(f"# TYPE cowsays_stage_{counter} gauge")
+            for stage, stats in report['stages'].items():
+                lines.append(f'cowsays_stage_{counter}{{stage="{stage}"}} {stats[counter]:g}')
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        self.end()
+        report = self.report()
+        for stage, stats in report['stages'].items():
+            print(f"  {stage:<18} {stats['seconds']:7.2f}s  calls={stats['calls']} retries={stats['retries']} "
+                  f"bytes={stats['bytes']} tokens={stats['prompt_tokens']}+{stats['output_tokens']}")
+        try:
+            if RUN_REPORT_PATH:
+                with open(RUN_REPORT_PATH, "w", encoding="utf-8") as report_file:
+                    json.dump(report, report_file, indent=2)
+            if METRICS_TEXTFILE_PATH:
+                # Write then rename so a scraper never reads a half-written file
+                with open(METRICS_TEXTFILE_PATH + ".tmp", "w", encoding="utf-8") as metrics_file:
+                    metrics_file.write(self.prometheus(report))
+                os.replace(METRICS_TEXTFILE_PATH + ".tmp", METRICS_TEXTFILE_PATH)
+        except OSError as e:
+            print(f"Warning: Could not write run metrics: {e}")
+
+run_metrics = RunMetrics()
+
+def finish_run():
+    """
+    Prints the end-of-run summaries and writes the metrics files.
+    Called from main() on the way out, whether or not the run succeeded.
+    """
+    print("Run summary:")
+    run_metrics.write()
+    if get_classification_cache.cache_info().currsize: # Not set up yet if the fetch step failed
+        get_classification_cache().report()
+
+# --- API keys ---
+# Read API keys from environment variables. Nothing is read at import time; main() checks
+# everything the run needs up front, and each client reads its key when it is first created.
+def require_env(name):
+    value = os.environ.get(name)
+    if not value:
+        raise ValueError(f"{name} environment variable not set.")
+    return value
 
 # --- Configure Gemini (UPDATED FOR NEW SDK) ---
-# Read API key from environment variable
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY environment variable not set.")
-
-# Initialize the new Client object
-client = genai.Client(api_key=GEMINI_API_KEY)
-
-# Define shared safety settings for the new SDK
-safety_config = types.GenerateContentConfig(
-    safety_settings=[
-        types.SafetySetting(
-            category=types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-            threshold=types.HarmBlockThreshold.BLOCK_NONE,
-        ),
-        types.SafetySetting(
-            category=types.HarmCategory.HARM_CATEGORY_HARASSMENT,
-            threshold=types.HarmBlockThreshold.BLOCK_NONE,
-        ),
-        types.SafetySetting(
-            category=types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-            threshold=types.HarmBlockThreshold.BLOCK_NONE,
-        ),
-        types.SafetySetting(
-            category=types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-            threshold=types.HarmBlockThreshold.BLOCK_NONE,
-        )
-    ]
-)
+# google-genai is slow to import, so the SDK, client and configs are only created on first use.
+def genai_types():
+    from google.genai import types
+    return types
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """
+    Returns the shared Gemini client, creating it on first use.
+    """
+    from google import genai
+    # Initialize the new Client object. The HTTP timeout stops abandoned (timed out or
+    # out-hedged) requests from holding a worker thread forever.
+    return genai.Client(
+        api_key=require_env("GEMINI_API_KEY"),
+        http_options=genai_types().HttpOptions(timeout=int(LLM_DEADLINE * 1000))
+    )
+
+@functools.lru_cache(maxsize=None)
+def get_safety_config():
+    types = genai_types()
+    # Define shared safety settings for the new SDK
+    return types.GenerateContentConfig(
+        safety_settings=[
+            types.SafetySetting(
+                category=types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+                threshold=types.HarmBlockThreshold.BLOCK_NONE,
+            ),
+            types.SafetySetting(
+                category=types.HarmCategory.HARM_CATEGORY_HARASSMENT,
+                threshold=types.HarmBlockThreshold.BLOCK_NONE,
+            ),
+            types.SafetySetting(
+                category=types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+                threshold=types.HarmBlockThreshold.BLOCK_NONE,
+            ),
+            types.SafetySetting(
+                category=types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+                threshold=types.HarmBlockThreshold.BLOCK_NONE,
+            )
+        ]
+    )
+
+# --- Gemini rate limiting ---
+# Every Gemini call takes a token from this bucket instead of sleeping a fixed second afterwards.
+# GEMINI_BURST calls may start at once, after which calls are spread out to GEMINI_REQUESTS_PER_SECOND.
+GEMINI_REQUESTS_PER_SECOND = float(os.environ.get("GEMINI_REQUESTS_PER_SECOND", 1))
+GEMINI_BURST = int(os.environ.get("GEMINI_BURST", 4))
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Holds up to `capacity` tokens and refills at `rate` tokens per second.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available, then takes it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+gemini_rate_limiter = TokenBucket(GEMINI_REQUESTS_PER_SECOND, GEMINI_BURST)
+
+# --- Gemini call layer ---
+# Every generate_content call goes through generate_content() below. Models are tried in LLM_MODELS order,
+# except that one whose recent calls mostly failed, or whose p95 latency is over LLM_SLOW_SECONDS, is moved
+# to the back. If the first answer takes longer than that model's recent p95, a duplicate (hedged) request is
+# sent, then the next model is tried; the first good answer wins. Nothing is waited on past LLM_DEADLINE.
+LLM_MODELS = [model.strip() for model in os.environ.get("LLM_MODELS", "gemini-3.1-flash-lite,gemini-2.5-flash-lite").split(",") if model.strip()]
+LLM_DEADLINE = float(os.environ.get("LLM_DEADLINE", 30)) # Seconds per call, hedges and fallbacks included
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "1").lower() in ("1", "true", "yes")
+LLM_HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", 1)) # Seconds; never hedge sooner than this
+LLM_SLOW_SECONDS = float(os.environ.get("LLM_SLOW_SECONDS", 10))
+LLM_MAX_ERROR_RATE = float(os.environ.get("LLM_MAX_ERROR_RATE", 0.5))
+LLM_TRACKER_WINDOW = 300 # Seconds of history the tracker looks at
+LLM_TRACKER_MIN_SAMPLES = 5 # Below this, a model's history is too thin to judge
+# Threads for in-flight requests. An abandoned hedge keeps its thread until LLM_DEADLINE, so 0 (the default)
+# sizes the pool for every classification worker and title candidate launching all of its attempts at once.
+# Raise it when several editions title at the same time.
+LLM_MAX_WORKERS = int(os.environ.get("LLM_MAX_WORKERS", 0))
+
+class LatencyTracker:
+    """
+    Rolling record of recent call latencies and failures, per model and kind of call
+    (a 16-headline batch is naturally slower than a single headline).
+    """
+    def __init__(self, window=LLM_TRACKER_WINDOW):
+        self.window = window
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, key, seconds, ok):
+        with self.lock:
+            self.samples.setdefault(key, []).append((time.monotonic(), seconds, ok))
+
+    def recent(self, key):
+        cutoff = time.monotonic() - self.window
+        with self.lock:
+            samples = [sample for sample in self.samples.get(key, []) if sample[0] >= cutoff]
+            self.samples[key] = samples
+        return samples
+
+    def p95(self, key):
+        """
+        The 95th percentile latency of recent successful calls, or None without enough history.
+        """
+        latencies = sorted(seconds for _, seconds, ok in self.recent(key) if ok)
+        if len(latencies) < LLM_TRACKER_MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def degraded(self, key):
+        samples = self.recent(key)
+        if len(samples) < LLM_TRACKER_MIN_SAMPLES:
+            return False
+        error_rate = sum(1 for _, _, ok in samples if not ok) / len(samples)
+        return error_rate >= LLM_MAX_ERROR_RATE or (self.p95(key) or 0) > LLM_SLOW_SECONDS
+
+    def route(self, models, kind):
+        """
+        Returns the models to try, healthy ones first, otherwise in the configured order.
+        """
+        return sorted(models, key=lambda model: self.degraded((model, kind)))
+
+llm_tracker = LatencyTracker()
+
+def llm_launches_per_call():
+    """
+    The most requests one generate_content() call can have in flight: the first try, a hedge and each fallback model.
+    """
+    return len(LLM_MODELS) + (1 if LLM_HEDGE else 0)
+
+@functools.lru_cache(maxsize=None)
+def get_llm_pool():
+    workers = LLM_MAX_WORKERS or (CLASSIFY_MAX_WORKERS + TITLE_CANDIDATES) * llm_launches_per_call()
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini")
+
+def call_model(model, contents, config, kind, stage, wait_for_token):
+    """
+    One attempt against one model, timed into the tracker.
+    """
+    if wait_for_token:
+        gemini_rate_limiter.acquire()
+    started = time.monotonic()
+    try:
+        response = get_client().models.generate_content(model=model, contents=contents, config=config)
+    except Exception:
+        llm_tracker.record((model, kind), time.monotonic() - started, False)
+        raise
+    llm_tracker.record((model, kind), time.monotonic() - started, True)
+    run_metrics.record_llm(response, stage)
+    return response
+
+def generate_content(contents, config, kind, stage=None):
+    """
+    Sends a generate_content request with hedging and model fallback (see above).
+    Returns the first successful response; raises the last error if every model failed,
+    or TimeoutError if nothing answered within LLM_DEADLINE.
+    """
+    stage = stage or run_metrics.current
+    models = llm_tracker.route(LLM_MODELS, kind)
+    # Hedges go to the same model once, then on down the fallback list
+    launches = [models[0]] + ([models[0]] if LLM_HEDGE else []) + models[1:]
+    gemini_rate_limiter.acquire()
+    deadline = time.monotonic() + LLM_DEADLINE
+    outstanding = {}
+    last_error = None
+
+    def launch(wait_for_token=True):
+        model = launches.pop(0)
+        if outstanding or last_error:
+            run_metrics.record(stage, retries=1)
+        future = get_llm_pool().submit(call_model, model, contents, config, kind, stage, wait_for_token)
+        outstanding[future] = model
+
+    launch(wait_for_token=False)
+    while outstanding:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        # Wait for an answer, but only as long as the latest model usually takes before hedging
+        hedge_delay = max(LLM_HEDGE_MIN_DELAY, llm_tracker.p95((list(outstanding.values())[-1], kind)) or LLM_DEADLINE / 4)
+        done, _ = futures_wait(outstanding, timeout=min(remaining, hedge_delay) if launches else remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            model = outstanding.pop(future)
+            if future.exception() is None:
+                return future.result()
+            last_error = future.exception()
+            print(f"Gemini call to {model} failed: {last_error}")
+            if any(queued != model for queued in launches):
+                # Don't hedge a model that just failed when there is another one to fall back to
+                launches[:] = [queued for queued in launches if queued != model]
+        if launches and (not done or not outstanding):
+            # Slow (hedge) or everything in flight failed (fall back)
+            launch()
+    if last_error and not outstanding:
+        raise last_error
+    raise TimeoutError(f"No answer from Gemini within {LLM_DEADLINE:g} seconds.")
 
 # --- Ghost API Config ---
-# Read API key from environment variable
-ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY")
-if not ADMIN_API_KEY:
-    raise ValueError("ADMIN_API_KEY environment variable not set.")
-GHOST_URL = os.environ.get("GHOST_URL")
-if not GHOST_URL:
-    raise ValueError("GHOST_URL environment variable not set.")
-GHOST_AUTHOR = os.environ.get("GHOST_AUTHOR")
-if not GHOST_AUTHOR:
-    raise ValueError("GHOST_AUTHOR environment variable not set.")
+# ADMIN_API_KEY, GHOST_URL and GHOST_AUTHOR are read through require_env() when posting.
 
 
 ## Step 1 - Get the News with NewsAPI.org ##
 ############################################
 
-def get_top_headlines():
+# What to fetch. Every (category, page) pair is its own request and they run concurrently,
+# so a bigger candidate pool doesn't make this step slower. Leave NEWS_CATEGORIES empty for
+# the general top headlines, or list NewsAPI categories (business, sports, technology, ...).
+NEWS_COUNTRY = os.environ.get("NEWS_COUNTRY", "us") # standard 2-letter ISO 3166-1 code
+NEWS_CATEGORIES = [c.strip() for c in os.environ.get("NEWS_CATEGORIES", "").split(",") if c.strip()]
+NEWS_PAGES = int(os.environ.get("NEWS_PAGES", 1))
+NEWS_PAGE_SIZE = int(os.environ.get("NEWS_PAGE_SIZE", 32)) # Shoot for 25 articles, with at least a few filtered out.
+NEWS_MAX_WORKERS = int(os.environ.get("NEWS_MAX_WORKERS", 4))
+NEWS_MAX_RETRIES = 3
+HTTP_TIMEOUT = 15 # Seconds
+
+def backoff_delay(attempt, response=None, base=2, cap=60):
     """
-    Fetches the top 25 US headlines using the official NewsAPI.org v2 endpoint.
-    Includes a retry mechanism: checks once, waits 30 seconds on failure, and tries again.
-    Documentation: https://newsapi.org/docs/endpoints/top-headlines
+    How long to wait before retry number `attempt` (1-based).
+    Honors a Retry-After header (seconds or HTTP date) when the server sends one,
+    otherwise uses exponential backoff with full jitter.
+    """
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return min(cap, max(0, float(retry_after)))
+        except ValueError:
+            try:
+                when = email.utils.parsedate_to_datetime(retry_after)
+                return min(cap, max(0, when.timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+@functools.lru_cache(maxsize=None)
+def get_news_session():
+    """
+    One pooled, keep-alive session shared by every NewsAPI request.
+    """
+    session = requests.Session()
+    session.headers.update({'X-Api-Key': require_env("NEWS_API_KEY")}) # Pass the API key in the header
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=NEWS_MAX_WORKERS))
+    return session
+
+# --- NewsAPI response cache ---
+# Successful responses are saved under NEWS_CACHE_DIR, one file per set of query params.
+# A response younger than NEWS_CACHE_MAX_AGE seconds is reused without any request; an older one is
+# revalidated with its ETag/Last-Modified so an unchanged feed costs a 304 instead of a full download.
+# NEWS_CACHE_MODE: "normal", "off" (always download), or "replay" (never touch the network, only
+# serve what is cached - handy for offline runs and benchmarking against a recorded fixture).
+NEWS_CACHE_DIR = os.environ.get("NEWS_CACHE_DIR", ".cache/newsapi")
+NEWS_CACHE_MAX_AGE = int(os.environ.get("NEWS_CACHE_MAX_AGE", 900)) # Seconds
+NEWS_CACHE_MODE = os.environ.get("NEWS_CACHE_MODE", "normal").lower()
+
+def news_cache_path(params):
+    key = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:32]
+    return os.path.join(NEWS_CACHE_DIR, f"{key}.json")
+
+def load_cached_response(params):
+    """
+    Returns the cache entry for these params ({fetched_at, etag, last_modified, data}), or None.
+    """
+    if NEWS_CACHE_MODE == "off":
+        return None
+    try:
+        with open(news_cache_path(params), encoding="utf-8") as cache_file:
+            return json.load(cache_file)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def store_cached_response(params, entry):
+    if NEWS_CACHE_MODE == "off":
+        return
+    try:
+        os.makedirs(NEWS_CACHE_DIR, exist_ok=True)
+        path = news_cache_path(params)
+        with open(path + ".tmp", "w", encoding="utf-8") as cache_file:
+            json.dump(dict(entry, params=params), cache_file)
+        os.replace(path + ".tmp", path) # Atomic, so a crash never leaves half a file behind
+    except OSError as e:
+        print(f"Warning: Could not write NewsAPI cache: {e}")
+
+def fetch_headlines_page(params):
+    """
+    Fetches one page of top headlines, going through the response cache first.
+    Retries timeouts, 429s and 5xx responses; other errors (like a bad API key) won't get
+    better on retry, so they return an empty list.
     """
-     
     url = "https://newsapi.org/v2/top-headlines"
-
-    # Define parameters according to NewsAPI docs
-    params = {
-        'country': 'us',      # standard 2-letter ISO 3166-1 code
-        'pageSize': 32        # Shoot for 25 articles, with at least a few filtered out.
-    }
-
-    # Pass the API key in the header
-    headers = {
-        'X-Api-Key': NEWS_API_KEY
-    }
-    
-    max_retries = 3
-    retry_delay = 30 # Seconds
-
-    for attempt in range(1, max_retries + 1):
-        print(f"Connecting to NewsAPI.org (Attempt {attempt}/{max_retries})...")
-
+    label = ", ".join(f"{key}={value}" for key, value in params.items())
+
+    cached = load_cached_response(params)
+    if NEWS_CACHE_MODE == "replay":
+        if cached is None:
+            print(f"Replay mode: nothing cached for {label}.")
+            return []
+        print(f"Replay mode: using cached response for {label}.")
+        run_metrics.record(cache_hits=1)
+        return cached['data'].get('articles', [])
+    if cached and time.time() - cached['fetched_at'] < NEWS_CACHE_MAX_AGE:
+        print(f"Using cached NewsAPI response for {label} ({int(time.time() - cached['fetched_at'])}s old).")
+        run_metrics.record(cache_hits=1)
+        return cached['data'].get('articles', [])
+
+    # Ask the server to answer 304 Not Modified if our copy is still current
+    conditional_headers = {}
+    if cached and cached.get('etag'):
+        conditional_headers['If-None-Match'] = cached['etag']
+    if cached and cached.get('last_modified'):
+        conditional_headers['If-Modified-Since'] = cached['last_modified']
+
+    for attempt in range(1, NEWS_MAX_RETRIES + 1):
+        print(f"Connecting to NewsAPI.org for {label} (Attempt {attempt}/{NEWS_MAX_RETRIES})...")
+        response = None
         try:
-            response = requests.get(url, params=params, headers=headers)
-            response.raise_for_status() # Raises error for 4xx/5xx status codes
+            response = get_news_session().get(url, params=params, headers=conditional_headers, timeout=HTTP_TIMEOUT)
+            run_metrics.record_http(response)
+            if response.status_code == 304 and cached:
+                print(f"NewsAPI response for {label} not modified, reusing cached copy.")
+                store_cached_response(params, dict(cached, fetched_at=time.time()))
+                return cached['data'].get('articles', [])
+            if response.status_code == 429 or response.status_code >= 500:
+                raise requests.exceptions.HTTPError(f"{response.status_code} from NewsAPI")
 
             data = response.json()
 
             # NewsAPI returns a 'status' field we should check
-            if data.get('status') != 'ok':
+            if response.status_code != 200 or data.get('status') != 'ok':
                 print(f"NewsAPI Error: {data.get('code')} - {data.get('message')}")
-                # If it's a logic error (like bad API key), retrying usually won't help, so we break or return empty
                 return []
 
+            store_cached_response(params, {
+                'fetched_at': time.time(),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'data': data
+            })
+
             # The articles are exactly where we need them
-            articles = data.get('articles', [])
-            return articles
+            return data.get('articles', [])
 
         except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
-            print(f"Error fetching news: {e}")
-            
+            print(f"Error fetching news for {label}: {e}")
+
             # If this is not the last attempt, wait and retry
-            if attempt < max_retries:
-                print(f"Waiting {retry_delay} seconds before retrying...")
-                time.sleep(retry_delay)
+            if attempt < NEWS_MAX_RETRIES:
+                run_metrics.record(retries=1)
+                delay = backoff_delay(attempt, response)
+                print(f"Waiting {delay:.1f} seconds before retrying...")
+                time.sleep(delay)
             else:
                 print("All retry attempts failed.")
-                return []
 
     return []
 
-# --- Execution of step 1 ---
-articles = get_top_headlines()
+def get_top_headlines(country=None):
+    """
+    Fetches top headlines for a country (NEWS_COUNTRY by default) using the official NewsAPI.org v2 endpoint.
+    Requests every configured category and page concurrently and merges the results by URL,
+    keeping the order of the first query (and page) each article appeared in.
+    Documentation: https://newsapi.org/docs/endpoints/top-headlines
+    """
+    queries = []
+    for category in NEWS_CATEGORIES or [None]:
+        for page in range(1, NEWS_PAGES + 1):
+            # Define parameters according to NewsAPI docs
+            params = {'country': country or NEWS_COUNTRY, 'pageSize': NEWS_PAGE_SIZE, 'page': page}
+            if category:
+                params['category'] = category
+            queries.append(params)
+
+    with ThreadPoolExecutor(max_workers=NEWS_MAX_WORKERS) as pool:
+        pages = list(pool.map(fetch_headlines_page, queries))
+
+    articles = []
+    seen_urls = set()
+    for page in pages:
+        for article in page:
+            if article.get('url') and article['url'] not in seen_urls:
+                seen_urls.add(article['url'])
+                articles.append(article)
+    return articles
 
-if articles:
-    print(f"Successfully fetched {len(articles)} headlines from NewsAPI.org.")
-else:
-    print("Error: Failed to fetch articles after retries. Exiting")
-    sys.exit(1)
 
 
 ## Step 2 - Classify the news into Categories ##
 ################################################
 
-def get_news_topic(headline):
-    print(f"Classifying news article: {headline}")
-    """
-    Uses Google Gemini to classify a headline into one of your topics.
-    """
-    prompt = f"""
-    You are an expert news article classifier. Your task is to analyze a news article headline and assign a single, most relevant category from the defined list.
+# The categories Gemini is allowed to pick from. Anything else ends up in "Other".
+valid_categories = ["Business", "Technology", "Education", "Science", "Weather", "Health", "Sports", "Politics", "Entertainment", "T's and P's"]
 
+# Category definitions and rules shared by the single and batched classification prompts
+CATEGORY_DEFINITIONS = """
     **CATEGORY LIST AND DEFINITIONS:**
     1.  **Business:** Stock markets, corporate earnings, industry trends, personal finance, economic indicators (inflation, employment).
     2.  **Technology:** Software, hardware, AI, social media platform changes, consumer electronics, cybersecurity.
@@ -159,97 +585,1231 @@ def get_news_topic(headline):
     2.  **Be Aggressive:** You MUST select one of the defined categories (1-9) if there is any reasonable connection.
     3.  **Ambiguity Fallback:** If a headline is ambiguous, default to the category that represents the broader trend or source institution.
     4.  **Use 'Other' ONLY if categories 1-9 are not broadly applicable to the headline.**
+"""
+
+# --- Shared classifier context ---
+# The classifier's role and the category definitions are the same in every classification request, so they
+# are sent as the system instruction instead of being repeated in each prompt. This keeps the prompts short
+# to read and log, but Gemini bills a system instruction like any other input tokens. It is also well under
+# the 1,024 tokens Gemini needs before it will cache a context, so it isn't cached either.
+CLASSIFY_SYSTEM_INSTRUCTION = f"""
+    You are an expert news article classifier. Your task is to analyze news article headlines and assign each one a single, most relevant category from the defined list.
+    {CATEGORY_DEFINITIONS}
+"""
+
+@functools.lru_cache(maxsize=None)
+def get_classify_single_config():
+    return get_safety_config().model_copy(update={'system_instruction': CLASSIFY_SYSTEM_INSTRUCTION})
+
+# How many headlines go into a single batched classification request, and how many of those
+# requests may be in flight at once. Batches are still subject to gemini_rate_limiter.
+CLASSIFY_BATCH_SIZE = int(os.environ.get("CLASSIFY_BATCH_SIZE", 16))
+CLASSIFY_MAX_WORKERS = int(os.environ.get("CLASSIFY_MAX_WORKERS", 4))
+
+@functools.lru_cache(maxsize=None)
+def get_classify_batch_config():
+    """
+    Batched requests ask Gemini for structured JSON instead of free text, with an impact
+    score next to each category for story selection.
+    """
+    types = genai_types()
+    return types.GenerateContentConfig(
+        safety_settings=get_safety_config().safety_settings,
+        system_instruction=CLASSIFY_SYSTEM_INSTRUCTION,
+        response_mime_type="application/json",
+        response_schema=types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "index": types.Schema(type=types.Type.INTEGER),
+                    "category": types.Schema(type=types.Type.STRING, enum=valid_categories + ["Other"]),
+                    "impact": types.Schema(type=types.Type.INTEGER, minimum=1, maximum=5),
+                },
+                required=["index", "category", "impact"],
+            ),
+        ),
+    )
+
+# --- Classification cache ---
+# Wire stories show up in top-headlines for several runs in a row, so labels are kept in a small
+# SQLite file keyed by the normalized headline and the prompt version. Set CLASSIFY_CACHE_PATH to ""
+# to turn the cache off.
+CLASSIFY_CACHE_PATH = os.environ.get("CLASSIFY_CACHE_PATH", ".cache/classifications.sqlite3")
+CLASSIFY_CACHE_TTL = int(os.environ.get("CLASSIFY_CACHE_TTL", 7 * 24 * 3600)) # Seconds
+CLASSIFY_CACHE_MAX_ENTRIES = int(os.environ.get("CLASSIFY_CACHE_MAX_ENTRIES", 5000))
+
+# Changes whenever the category prompt or list does, which invalidates every cached label
+PROMPT_VERSION = hashlib.sha256((CATEGORY_DEFINITIONS + "|".join(valid_categories)).encode()).hexdigest()[:12]
+
+def normalize_headline(headline):
+    """
+    Lowercases a headline and strips punctuation and extra whitespace so trivial
+    differences between outlets ("Fed holds rates." vs "Fed Holds Rates") compare equal.
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", headline.lower()).split())
+
+class ClassificationCache:
+    """
+    On-disk headline -> category cache with TTL and size-based eviction.
+    Only used from the main thread; worker threads never touch the connection.
+    """
+    def __init__(self, path, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if not path:
+            return
 
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS classifications (key TEXT PRIMARY KEY, category TEXT NOT NULL, created_at REAL NOT NULL, impact INTEGER)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS classifications_created_at ON classifications (created_at)")
+            if "impact" not in [column[1] for column in self.db.execute("PRAGMA table_info(classifications)")]:
+                self.db.execute("ALTER TABLE classifications ADD COLUMN impact INTEGER") # Caches from before impact scores
+            self.evict()
+        except sqlite3.Error as e:
+            print(f"Warning: Could not open classification cache '{path}': {e}. Continuing without it.")
+            self.db = None
+
+    def key(self, headline):
+        return hashlib.sha256(f"{PROMPT_VERSION}:{normalize_headline(headline)}".encode()).hexdigest()
+
+    def get(self, headline):
+        """
+        Returns the cached (category, impact) for a headline, or None on a miss.
+        Impact is None for labels that came without a score.
+        """
+        row = None
+        if self.db:
+            row = self.db.execute(
+                "SELECT category, impact FROM classifications WHERE key = ? AND created_at >= ?",
+                (self.key(headline), time.time() - self.ttl)
+            ).fetchone()
+        if row:
+            self.hits += 1
+            return row
+        self.misses += 1
+        return None
+
+    def put_many(self, labels):
+        """
+        Stores a list of (headline, category, impact) triples.
+        """
+        if not self.db or not labels:
+            return
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO classifications (key, category, created_at, impact) VALUES (?, ?, ?, ?)",
+                [(self.key(headline), category, now, impact) for headline, category, impact in labels]
+            )
+        self.evict()
+
+    def evict(self):
+        """
+        Drops expired labels, then the oldest ones beyond max_entries.
+        """
+        with self.db:
+            self.db.execute("DELETE FROM classifications WHERE created_at < ?", (time.time() - self.ttl,))
+            self.db.execute(
+                "DELETE FROM classifications WHERE key IN (SELECT key FROM classifications ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def report(self):
+        print(f"Classification cache: {self.hits} hits, {self.misses} misses (prompt version {PROMPT_VERSION}).")
+
+@functools.lru_cache(maxsize=None)
+def get_classification_cache():
+    return ClassificationCache(CLASSIFY_CACHE_PATH, CLASSIFY_CACHE_TTL, CLASSIFY_CACHE_MAX_ENTRIES)
+
+# --- Local pre-classifier ---
+# Every label Gemini hands back is appended to LABEL_LOG_PATH. Once the log holds PRECLASSIFY_MIN_EXAMPLES
+# labels, a small local model trained on it answers the headlines it is at least PRECLASSIFY_THRESHOLD
+# sure about, and only the rest go to Gemini. Set PRECLASSIFY_THRESHOLD above 1 to always ask Gemini.
+LABEL_LOG_PATH = os.environ.get("LABEL_LOG_PATH", ".cache/labels.jsonl")
+PRECLASSIFY_THRESHOLD = float(os.environ.get("PRECLASSIFY_THRESHOLD", 0.95))
+PRECLASSIFY_MIN_EXAMPLES = int(os.environ.get("PRECLASSIFY_MIN_EXAMPLES", 300))
+# The log keeps only the newest labels made with the current category prompt (0 keeps them all)
+LABEL_LOG_MAX_ENTRIES = int(os.environ.get("LABEL_LOG_MAX_ENTRIES", 20000))
+
+class HeadlinePreClassifier:
+    """
+    Multinomial naive Bayes over hashed word unigrams and bigrams.
+    In log space this is a linear model, so scoring a headline costs one dictionary lookup
+    per n-gram per category and needs nothing beyond the standard library.
+    """
+    FEATURE_BUCKETS = 2 ** 18
+
+    def __init__(self):
+        self.examples = 0
+        self.class_counts = {}   # category -> training headlines
+        self.feature_counts = {} # category -> {bucket: count}
+        self.feature_totals = {} # category -> total features seen
+        self.vocabulary = set()
+
+    @classmethod
+    def features(cls, headline):
+        words = normalize_headline(headline).split()
+        grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return [zlib.crc32(gram.encode()) % cls.FEATURE_BUCKETS for gram in grams]
+
+    @classmethod
+    def from_log(cls, path, max_entries=0):
+        """
+        Trains a model from a JSON-lines log of {"headline": ..., "category": ..., "prompt_version": ...}
+        records, using only the newest `max_entries` labels made with the current PROMPT_VERSION.
+        Anything else in the log (labels from an older prompt, bad lines, entries past the cap) is
+        rewritten out of it. A missing log just gives an untrained model.
+        """
+        model = cls()
+        records = collections.deque(maxlen=max_entries or None)
+        lines = 0
+        try:
+            with open(path, encoding="utf-8") as log:
+                for line in log:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get('prompt_version') == PROMPT_VERSION and record.get('category') in valid_categories + ["Other"]:
+                        records.append(record)
+        except OSError:
+            return model
+
+        if len(records) < lines:
+            rewrite_label_log(path, records)
+        for record in records:
+            model.train(record['headline'], record['category'])
+        return model
+
+    def train(self, headline, category):
+        self.examples += 1
+        self.class_counts[category] = self.class_counts.get(category, 0) + 1
+        counts = self.feature_counts.setdefault(category, {})
+        for feature in self.features(headline):
+            counts[feature] = counts.get(feature, 0) + 1
+            self.feature_totals[category] = self.feature_totals.get(category, 0) + 1
+            self.vocabulary.add(feature)
+
+    def predict(self, headline):
+        """
+        Returns (category, confidence) where confidence is the posterior probability of that category.
+        """
+        if not self.examples:
+            return None, 0.0
+        # n-grams never seen in training carry no information, so they are skipped
+        features = [feature for feature in self.features(headline) if feature in self.vocabulary]
+        scores = {}
+        for category, count in self.class_counts.items():
+            counts = self.feature_counts[category]
+            denominator = self.feature_totals[category] + len(self.vocabulary)
+            score = math.log(count / self.examples)
+            for feature in features:
+                score += math.log((counts.get(feature, 0) + 1) / denominator)
+            scores[category] = score
+
+        best = max(scores, key=scores.get)
+        total = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1 / total
+
+def append_label_log(labels):
+    """
+    Appends (headline, category) pairs from Gemini to LABEL_LOG_PATH for future training.
+    """
+    if not LABEL_LOG_PATH or not labels:
+        return
+    try:
+        os.makedirs(os.path.dirname(LABEL_LOG_PATH) or ".", exist_ok=True)
+        with open(LABEL_LOG_PATH, "a", encoding="utf-8") as log:
+            for headline, category in labels:
+                log.write(json.dumps({"headline": headline, "category": category, "prompt_version": PROMPT_VERSION}) + "\n")
+    except OSError as e:
+        print(f"Warning: Could not write label log '{LABEL_LOG_PATH}': {e}")
+
+def rewrite_label_log(path, records):
+    """
+    Replaces the label log with `records`, atomically so a crash can't lose it.
+    """
+    try:
+        with open(path + ".tmp", "w", encoding="utf-8") as log:
+            for record in records:
+                log.write(json.dumps(record) + "\n")
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Warning: Could not rewrite label log '{path}': {e}")
+
+@functools.lru_cache(maxsize=None)
+def get_preclassifier():
+    """
+    Trains the pre-classifier from the label log on first use.
+    """
+    preclassifier = HeadlinePreClassifier.from_log(LABEL_LOG_PATH, LABEL_LOG_MAX_ENTRIES) if LABEL_LOG_PATH else HeadlinePreClassifier()
+    if preclassifier.examples >= PRECLASSIFY_MIN_EXAMPLES:
+        print(f"Local pre-classifier trained on {preclassifier.examples} past labels.")
+    else:
+        print(f"Local pre-classifier has {preclassifier.examples}/{PRECLASSIFY_MIN_EXAMPLES} labels, sending everything to Gemini.")
+    return preclassifier
+
+def match_category(raw_result):
+    """
+    Maps raw model output onto one of valid_categories.
+    Lighter models often add markdown (like **Politics**) or prefixes (like "Category: Politics"),
+    so we do a substring match to ensure we perfectly match our dictionary keys.
+    Returns None if nothing matches.
+    """
+    for cat in valid_categories:
+        if cat.lower() in raw_result.lower():
+            return cat
+    return None
+
+def classify_single(headline):
+    """
+    Classifies one headline with its own Gemini call.
+    Returns None if the call fails, so errors are never mistaken for (and cached as) a real "Other".
+    """
+    print(f"Classifying news article: {headline}")
+    # The role and category definitions come from the shared system instruction
+    prompt = f"""
     Headline: "{headline}"
     Category:
     """
     try:
-        # UPDATED: Use client.models.generate_content and the new model ID
-        response = client.models.generate_content(
-            model='gemini-3.1-flash-lite',
-            contents=prompt,
-            config=safety_config
-        )
-        time.sleep(1)
-        
-        raw_result = response.text.strip()
-        
-        # Lighter models often add markdown (like **Politics**) or prefixes (like "Category: Politics").
-        # We do a substring match to ensure we perfectly match our dictionary keys.
-        valid_categories = ["Business", "Technology", "Education", "Science", "Weather", "Health", "Sports", "Politics", "Entertainment", "T's and P's"]
-        
-        for cat in valid_categories:
-            if cat.lower() in raw_result.lower():
-                return cat
-                
-        return "Other" # Fallback if none of the specific topics match
-        
+        response = generate_content(prompt, get_classify_single_config(), kind="classify_single")
+
+        return match_category(response.text.strip()) or "Other" # Fallback if none of the specific topics match
+
     except Exception as e:
         print(f"Error classifying headline '{headline}': {e}")
-        return "Other"
+        return None
+
+def classify_batch(headlines):
+    """
+    Classifies a chunk of headlines with a single Gemini call, also asking how much each story matters.
+    Returns a dict of {index: (category, impact)} for every result that came back valid; impact is
+    1-5, or None if the model gave none.
+    Missing, duplicate or unrecognized entries are simply left out for the caller to retry.
+    """
+    numbered = "\n".join(f'    {i}. "{headline}"' for i, headline in enumerate(headlines))
+    # The role and category definitions come from the shared system instruction
+    prompt = f"""
+    Return a JSON array with one object per headline: {{"index": <headline number>, "category": <category name>, "impact": <1-5>}}.
+    Impact is how much the story matters to a general reader: 5 for major national or world news, 1 for minor or niche items.
+
+    Headlines:
+{numbered}
+    """
+    try:
+        response = generate_content(prompt, get_classify_batch_config(), kind="classify_batch")
+        results = json.loads(response.text)
+    except Exception as e:
+        print(f"Error classifying batch of {len(headlines)} headlines: {e}")
+        return {}
+
+    topics = {}
+    for item in results if isinstance(results, list) else []:
+        if not isinstance(item, dict):
+            continue
+        index = item.get('index')
+        raw_category = str(item.get('category', ''))
+        if not isinstance(index, int) or not 0 <= index < len(headlines) or index in topics:
+            continue
+        category = "Other" if raw_category.strip().lower() == "other" else match_category(raw_category)
+        impact = item.get('impact')
+        if category:
+            topics[index] = (category, min(5, max(1, impact)) if isinstance(impact, int) and not isinstance(impact, bool) else None)
+    return topics
+
+def get_news_topics(headlines, on_labeled=None, enough=None):
+    """
+    Classifies a list of headlines using as few Gemini calls as possible.
+    Cached labels are used first, then confident answers from the local pre-classifier.
+    The rest are sent in chunks of CLASSIFY_BATCH_SIZE, up to CLASSIFY_MAX_WORKERS chunks at a time;
+    any headline without a valid label in the batch response is retried on its own as soon as the
+    batch is back, falling back to "Other" if that fails too.
+    If given, on_labeled(topics, impacts) is called with the partly filled lists (None for headlines
+    still pending) whenever more labels come in, so later steps can start early.
+    If given, enough(topics, impacts) is asked the same way whether the labels so far are all the
+    caller needs; once it says yes, no further chunks are sent and the headlines in them stay None.
+    Returns (topics, impacts) in the same order as the headlines, however the calls finish. Impact is
+    None where there is no score (the pre-classifier and single retries don't give one).
+    """
+    classification_cache = get_classification_cache()
+    topics = [None] * len(headlines)
+    impacts = [None] * len(headlines)
+    for i, headline in enumerate(headlines):
+        cached = classification_cache.get(headline)
+        if cached:
+            topics[i], impacts[i] = cached
+    uncached = [i for i, topic in enumerate(topics) if topic is None]
+
+    preclassifier = get_preclassifier()
+    if preclassifier.examples >= PRECLASSIFY_MIN_EXAMPLES:
+        for i in uncached:
+            category, confidence = preclassifier.predict(headlines[i])
+            if confidence >= PRECLASSIFY_THRESHOLD:
+                topics[i] = category
+    pending = [i for i in uncached if topics[i] is None]
+    saved = len(uncached) - len(pending)
+    if saved:
+        saved_batches = math.ceil(len(uncached) / CLASSIFY_BATCH_SIZE) - math.ceil(len(pending) / CLASSIFY_BATCH_SIZE)
+        print(f"Local pre-classifier labeled {saved} headlines, saving {saved_batches} batch call(s) and {saved} headline(s) of Gemini input.")
+    starts = range(0, len(pending), CLASSIFY_BATCH_SIZE)
+    chunks = iter([pending[start:start + CLASSIFY_BATCH_SIZE] for start in starts])
+    print(f"Classifying {len(pending)} headlines in {len(starts)} batch(es) ({len(headlines) - len(uncached)} cached)...")
+    if on_labeled:
+        on_labeled(topics, impacts)
+    stopped = enough is not None and enough(topics, impacts)
+
+    done, failed = [], set()
+    with ThreadPoolExecutor(max_workers=CLASSIFY_MAX_WORKERS) as pool:
+        # Chunks are only submitted as earlier ones finish, so an early stop leaves the rest unsent
+        in_flight = collections.deque()
+        def submit_next():
+            chunk = next(chunks, None)
+            if chunk:
+                in_flight.append((classify_batch, chunk, pool.submit(classify_batch, [headlines[i] for i in chunk])))
+
+        for _ in range(CLASSIFY_MAX_WORKERS if not stopped else 0):
+            submit_next()
+        # Batch results are merged in submission order, so they line up with their chunks
+        while in_flight:
+            kind, chunk, future = in_flight.popleft()
+            if kind is classify_single:
+                # Failed calls fall back to "Other" for this run only
+                topics[chunk[0]] = future.result()
+                if topics[chunk[0]] is None:
+                    failed.add(chunk[0])
+                    topics[chunk[0]] = "Other"
+            else:
+                for index, (category, impact) in future.result().items():
+                    topics[chunk[index]], impacts[chunk[index]] = category, impact
+                done.extend(chunk)
+                missing = [i for i in chunk if topics[i] is None]
+                run_metrics.record(retries=len(missing))
+                for i in missing:
+                    print(f"No valid batch result for '{headlines[i]}', retrying on its own...")
+                    in_flight.append((classify_single, [i], pool.submit(classify_single, headlines[i])))
+            if on_labeled:
+                on_labeled(topics, impacts)
+            stopped = stopped or (enough is not None and enough(topics, impacts))
+            if not stopped and kind is classify_batch:
+                submit_next()
+
+    skipped = len(pending) - len(done)
+    if skipped:
+        print(f"Story selection settled early, skipping {skipped} headline(s) that can't make the cut.")
+
+    # Only real Gemini answers are cached and logged
+    labels = [(headlines[i], topics[i], impacts[i]) for i in done if i not in failed]
+    classification_cache.put_many(labels)
+    append_label_log([(headline, category) for headline, category, _ in labels])
+
+    return topics, impacts
+
+# Blocked terms and news sources live in filters.json next to this script (override with FILTER_CONFIG_PATH).
+# Terms match whole words, case-insensitively; a trailing '*' also matches longer words ("horoscope*" -> "horoscopes").
+# Sources match the link's host or any parent domain, so "x.com" blocks "www.x.com" but not "fedex.com",
+# and "gov" blocks every .gov site.
+FILTER_CONFIG_PATH = os.environ.get("FILTER_CONFIG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "filters.json"))
+
+class ArticleFilter:
+    """
+    Indexed block-rule matcher. Terms and sources are held in sets, so checking an article costs a
+    handful of lookups per word and per host label no matter how many rules are configured.
+    """
+    def __init__(self, blocked_terms, blocked_sources):
+        self.terms = set()     # normalized word sequences, e.g. "white house"
+        self.prefixes = set()  # single-word prefixes from rules ending in '*'
+        self.max_term_words = 1
+        for term in blocked_terms:
+            if term.endswith("*"):
+                self.prefixes.add(normalize_headline(term[:-1]))
+            else:
+                normalized = normalize_headline(term)
+                self.terms.add(normalized)
+                self.max_term_words = max(self.max_term_words, len(normalized.split()))
+        self.sources = {source.lower().strip(".") for source in blocked_sources}
 
-# Define the categories that most news stories will fall into
-grouped_headlines = {
-    "Business": [], "Technology": [], "Education": [], "Science": [], "Weather": [],
-    "Health": [], "Sports": [], "Politics": [], "Entertainment": [], "T's and P's": [], "Other": []
+    @classmethod
+    def from_config(cls, path):
+        try:
+            with open(path, encoding="utf-8") as config_file:
+                config = json.load(config_file)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Could not load filter config '{path}': {e}")
+        return cls(config.get('blocked_terms', []), config.get('blocked_sources', []))
+
+    def blocked_term(self, headline):
+        """
+        Returns the blocked term found in the headline, or None.
+        """
+        words = normalize_headline(headline).split()
+        for start, word in enumerate(words):
+            for length in range(1, self.max_term_words + 1):
+                phrase = " ".join(words[start:start + length])
+                if phrase in self.terms:
+                    return phrase
+            for end in range(1, len(word) + 1):
+                if word[:end] in self.prefixes:
+                    return word[:end] + "*"
+        return None
+
+    def blocked_source(self, url):
+        """
+        Returns the blocked domain the URL's host falls under, or None.
+        """
+        host = (urlparse(url).hostname or "").lower()
+        labels = host.split(".")
+        for i in range(len(labels)):
+            domain = ".".join(labels[i:])
+            if domain in self.sources:
+                return domain
+        return None
+
+    def check(self, headline, url):
+        """
+        Returns a description of the rule that blocks this article, or None if it may be used.
+        """
+        term = self.blocked_term(headline)
+        if term:
+            return f"term '{term}'"
+        source = self.blocked_source(url)
+        if source:
+            return f"source '{source}'"
+        return None
+
+@functools.lru_cache(maxsize=None)
+def get_article_filter():
+    return ArticleFilter.from_config(FILTER_CONFIG_PATH)
+
+# Outlets often run the same wire story with slightly different wording. Headlines whose word sets
+# overlap by at least DEDUP_SIMILARITY (Jaccard similarity, 0-1) count as the same story and only the
+# first one NewsAPI returned is kept. Set it above 1 to keep every headline.
+DEDUP_SIMILARITY = float(os.environ.get("DEDUP_SIMILARITY", 0.6))
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index over headline word sets.
+    Each headline gets a MinHash signature split into bands; only headlines sharing a band bucket are
+    compared exactly, so finding a match stays near-constant time however many headlines are indexed.
+    The signature is split into the longest bands that still put MIN_RECALL of the pairs exactly at
+    the threshold in a shared bucket: for 0.6 that is 16 bands of 2 rows, which finds 99.9% of them
+    (a pair is missed with probability (1 - s^rows)^bands at similarity s).
+    """
+    SIGNATURE_SIZE = 32
+    MIN_RECALL = 0.99
+    PRIME = (1 << 61) - 1
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.rows = next((
+            rows for rows in (8, 4, 2)
+            if 1 - (1 - max(threshold, 0) ** rows) ** (self.SIGNATURE_SIZE // rows) >= self.MIN_RECALL
+        ), 1)
+        self.bands = self.SIGNATURE_SIZE // self.rows
+        self.buckets = [{} for _ in range(self.bands)]
+        # Fixed seeds keep signatures comparable between runs and processes
+        self.permutations = [
+            (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") | 1,
+             int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big"))
+            for i in range(self.SIGNATURE_SIZE)
+        ]
+
+    def signature(self, words):
+        hashes = [int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "big") for word in words]
+        return [min((a * h + b) % self.PRIME for h in hashes) for a, b in self.permutations]
+
+    def band_keys(self, words):
+        signature = self.signature(words)
+        return [tuple(signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def find(self, headline):
+        """
+        Returns the item stored for a near-identical headline, or None.
+        """
+        words = set(normalize_headline(headline).split())
+        if not words:
+            return None
+        for bucket, key in zip(self.buckets, self.band_keys(words)):
+            for other_words, item in bucket.get(key, []):
+                if len(words & other_words) / len(words | other_words) >= self.threshold:
+                    return item
+        return None
+
+    def add(self, headline, item):
+        words = set(normalize_headline(headline).split())
+        if not words:
+            return
+        for bucket, key in zip(self.buckets, self.band_keys(words)):
+            bucket.setdefault(key, []).append((words, item))
+
+def remove_near_duplicates(candidates):
+    """
+    Keeps the first article of every cluster of near-identical headlines, in their original order.
+    """
+    if DEDUP_SIMILARITY > 1:
+        return candidates
+
+    index = NearDuplicateIndex(DEDUP_SIMILARITY)
+    unique = []
+    for article_data in candidates:
+        original = index.find(article_data['headline'])
+        if original:
+            print(f"-> Filtered (near-duplicate of '{original['headline']}'): {article_data['headline']}")
+            continue
+        index.add(article_data['headline'], article_data)
+        unique.append(article_data)
+    return unique
+
+# --- Headline archive ---
+# Every article that reaches an edition is recorded in a SQLite archive (ARCHIVE_PATH) with its category,
+# date and the Ghost post it went out in. Before classification, candidates that were already published
+# within NOVELTY_WINDOW_DAYS are dropped (NOVELTY_MODE=drop) or moved behind the fresh ones so they only
+# fill leftover slots (NOVELTY_MODE=demote). Set NOVELTY_MODE=off to publish repeats as before.
+ARCHIVE_PATH = os.environ.get("ARCHIVE_PATH", ".cache/archive.sqlite3")
+NOVELTY_WINDOW_DAYS = int(os.environ.get("NOVELTY_WINDOW_DAYS", 3))
+NOVELTY_MODE = os.environ.get("NOVELTY_MODE", "drop").lower()
+# Words too common to say two headlines are about the same story; left out of full-text searches
+ARCHIVE_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "he", "her", "his", "in",
+    "is", "it", "its", "new", "of", "on", "or", "over", "says", "she", "than", "that", "the", "their", "they",
+    "this", "to", "up", "was", "were", "what", "who", "will", "with", "after", "about", "into", "out", "more"
 }
 
-# Add blocked news sources that don't represent reputable news articles.
-filter_urls = ["facebook.com", "x.com", ".gov", "bsky.app", "threads.com", "truthsocial.com", "reddit.com", "instagram.com", "tiktok.com", "foxnews.com", "newsmax.com"]
+class HeadlineArchive:
+    """
+    Indexed store of processed articles. Repeats are found through B-tree indexes on the URL and
+    the normalized headline hash, plus an FTS5 full-text index that catches reworded headlines
+    (when this SQLite build has FTS5). Full-text searches are limited by rowid to the articles
+    recorded since the novelty window opened, so a lookup stays cheap as years of data pile up.
+    If the file can't be opened the archive stays empty, so nothing counts as a repeat.
+    """
+    def __init__(self, path):
+        self.db = None
+        self.full_text = False
+        self.window = (None, None) # (since, first rowid published on or after it)
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(path)
+            self.create_tables()
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: Could not open headline archive '{path}': {e}. Continuing without it.")
+            self.db = None
+
+    def create_tables(self):
+        with self.db:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS articles (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                headline TEXT NOT NULL,
+                headline_key TEXT NOT NULL,
+                category TEXT,
+                edition TEXT NOT NULL,
+                published_on TEXT NOT NULL,
+                post_id TEXT,
+                UNIQUE (url, edition, published_on)
+            )""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS articles_url ON articles (url, published_on)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS articles_headline_key ON articles (headline_key, published_on)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS articles_published_on ON articles (published_on)")
+        try:
+            with self.db:
+                self.db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(headline, content='articles', content_rowid='id')")
+            self.full_text = True
+        except sqlite3.OperationalError:
+            print("Warning: SQLite has no FTS5, the archive will only catch exact repeats.")
+            self.full_text = False
+
+    def first_id_since(self, since):
+        """
+        Returns the lowest rowid published on or after `since` (None if there is none), looked up once per window.
+        """
+        if self.window[0] != since:
+            row = self.db.execute("SELECT MIN(id) FROM articles WHERE published_on >= ?", (since,)).fetchone()
+            self.window = (since, row[0])
+        return self.window[1]
+
+    @staticmethod
+    def headline_key(headline):
+        return hashlib.sha256(normalize_headline(headline).encode()).hexdigest()
+
+    def record(self, edition, grouped_headlines, post_id, published_on):
+        """
+        Stores every article of a published edition. Recording the same edition twice in a day is a no-op.
+        """
+        if not self.db:
+            return
+        self.window = (None, None)
+        with self.db:
+            for category, articles in grouped_headlines.items():
+                for article_data in articles:
+                    cursor = self.db.execute(
+                        "INSERT OR IGNORE INTO articles (url, headline, headline_key, category, edition, published_on, post_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (article_data['url'], article_data['headline'], self.headline_key(article_data['headline']), category, edition, published_on, post_id)
+                    )
+                    if cursor.rowcount and self.full_text:
+                        self.db.execute("INSERT INTO articles_fts (rowid, headline) VALUES (?, ?)", (cursor.lastrowid, normalize_headline(article_data['headline'])))
+
+    def published_since(self, article_data, since):
+        """
+        Returns the archived headline this article repeats if it went out on or after `since`, else None.
+        """
+        row = self.db.execute(
+            "SELECT headline FROM articles WHERE post_id IS NOT NULL AND published_on >= ? AND (url = ? OR headline_key = ?) LIMIT 1",
+            (since, article_data['url'], self.headline_key(article_data['headline']))
+        ).fetchone()
+        if row:
+            return row[0]
+        if not self.full_text:
+            return None
+
+        # Reworded repeats: pull the full-text matches inside the window and check their word overlap
+        words = set(normalize_headline(article_data['headline']).split())
+        keywords = words - ARCHIVE_STOPWORDS
+        first_id = self.first_id_since(since)
+        if not keywords or first_id is None:
+            return None
+        query = " OR ".join(f'"{word}"' for word in keywords)
+        # Everything in the window has a rowid >= first_id, and since rows are appended as editions go
+        # out, little else does; FTS5 seeks straight to that range. The window holds few enough rows
+        # to check every match, and ranking them would make FTS5 read each word's whole doclist.
+        rows = self.db.execute(
+            "SELECT a.headline FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid "
+            "WHERE articles_fts MATCH ? AND articles_fts.rowid >= ? AND a.post_id IS NOT NULL AND a.published_on >= ?",
+            (query, first_id, since)
+        ).fetchall()
+        for (headline,) in rows:
+            other = set(normalize_headline(headline).split())
+            if len(words & other) / len(words | other) >= DEDUP_SIMILARITY:
+                return headline
+        return None
+
+@functools.lru_cache(maxsize=None)
+def get_archive():
+    return HeadlineArchive(ARCHIVE_PATH)
+
+def apply_novelty_filter(candidates):
+    """
+    Drops or demotes candidates that were already published within NOVELTY_WINDOW_DAYS.
+    """
+    if NOVELTY_MODE == "off" or not ARCHIVE_PATH:
+        return candidates
+
+    archive = get_archive()
+    if not archive.db:
+        return candidates
+    since = (datetime.date.today() - datetime.timedelta(days=NOVELTY_WINDOW_DAYS)).isoformat()
+    fresh, repeats = [], []
+    for article_data in candidates:
+        repeat_of = archive.published_since(article_data, since)
+        if repeat_of:
+            action = "Dropped" if NOVELTY_MODE == "drop" else "Demoted"
+            print(f"-> {action} (published in the last {NOVELTY_WINDOW_DAYS} days as '{repeat_of}'): {article_data['headline']}")
+            repeats.append(article_data)
+        else:
+            fresh.append(article_data)
+    if NOVELTY_MODE == "drop":
+        return fresh
+    # Story selection ranks repeats behind every fresh story
+    return fresh + [dict(article_data, repeat=True) for article_data in repeats]
+
+def filter_articles(articles):
+    """
+    Cleans up NewsAPI articles and drops blocked and near-duplicate ones.
+    Returns the survivors as {headline, source, url, published_at} dicts, in their original order.
+    """
+    article_filter = get_article_filter()
+    candidates = []
+    for article in articles:
+        article_url = canonicalize_url(article['url'])
+        original_url = article['url'] if article_url != article['url'] else None
+        headline = article['title']
+
+        # 1. Clean the headline formatting first so get_news_topics() gets clean text
+        separator = ' - '
+        if separator in headline:
+            headline = headline.split(separator, 1)[0]
+
+        # 2. Check for blocked terms (including horoscopes) and blocked sources
+        rule = article_filter.check(headline, article_url)
+        if rule:
+            print(f"-> Filtered (blocked {rule}): {headline} [{article_url}]")
+            continue
+
+        # 3. Build payload for everything that survived the filters
+        source_name = article.get('source', {}).get('name', 'Unknown Source')
+
+        candidates.append({
+            "headline": headline,
+            "source": source_name,
+            "url": article_url,
+            "published_at": article.get('publishedAt')
+        })
+        if original_url:
+            # Kept in case the cleaned-up link turns out not to work
+            candidates[-1]['original_url'] = original_url
+
+    # Drop repeats of the same story (today and on recent days) before spending classification calls and topic slots on them
+    return apply_novelty_filter(remove_near_duplicates(candidates))
+
+# --- Story selection ---
+# Every candidate gets a score: the impact Gemini gave it (1-5, 3 when unknown), plus up to 1 for
+# recency (halving every RECENCY_HALF_LIFE_HOURS since publishedAt) and up to 1 for its place in
+# the NewsAPI ranking. Stories are then taken best first, each topic keeping its top topic_cap,
+# until MAX_STORIES are in the post (an edition can set its own max_stories; 0 means no limit).
+# Every story already taken from a source costs the next one from it SOURCE_DIVERSITY_PENALTY.
+MAX_STORIES = int(os.environ.get("MAX_STORIES", 25))
+RECENCY_HALF_LIFE_HOURS = float(os.environ.get("RECENCY_HALF_LIFE_HOURS", 12))
+SOURCE_DIVERSITY_PENALTY = float(os.environ.get("SOURCE_DIVERSITY_PENALTY", 0.75))
+DEFAULT_IMPACT = 3
+MAX_IMPACT = 5
+REPEAT_PENALTY = 10 # More than any score difference, so demoted repeats only fill leftover slots
+
+# Define the categories that most news stories will fall into, in the order the post lists them
+TOPICS = (
+    "Business", "Technology", "Education", "Science", "Weather",
+    "Health", "Sports", "Politics", "Entertainment", "T's and P's", "Other"
+)
 
-# Add blocked terms here (combined horoscopes here to keep code dry)
-blocked_terms = ["trump", "white house", "IRS", "supreme court", "kushner", "horoscope"]
+def parse_published_at(published_at):
+    try:
+        published = datetime.datetime.fromisoformat(published_at.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return published if published.tzinfo else published.replace(tzinfo=datetime.timezone.utc)
 
-for article in articles:
-    article_url = article['url']
-    headline = article['title']
-    
-    # 1. Clean the headline formatting first so get_news_topic() gets clean text
-    separator = ' - '
-    if separator in headline:
-        headline = headline.split(separator, 1)[0]
-        
-    headline_lower = headline.lower()
-        
-    # 2. Check for Blocked terms (including horoscopes)
-    print("Checking for Blocked terms...")
-    if any(term in headline_lower for term in blocked_terms):
-        print(f"-> Filtered (Blocked Term/Horoscope): {headline}")
-        continue
-
-    # 3. Filter out some sources
-    print("Checking if blocked source...")
-    if any(source in article_url for source in filter_urls):
-        print(f"Found forbidden source in URL: {article_url}, skipping")
-        continue
-    
-    # 4. Classify and build payload
-    topic = get_news_topic(headline)
-    source_name = article.get('source', {}).get('name', 'Unknown Source')
-
-    article_data = {
-        "headline": headline,
-        "source": source_name,
-        "url": article_url
-    }
+class StorySelector:
+    """
+    Picks an edition's stories from its candidates (in NewsAPI order) by score.
+    Everything about a candidate except its impact is known before classification, so the
+    selector can also say when the stories still unclassified can no longer make the cut.
+    """
+    def __init__(self, candidates, include_topics=None, exclude_topics=(), topic_cap=10, other_cap=8, max_stories=MAX_STORIES, now=None):
+        self.candidates = candidates
+        self.include_topics = include_topics
+        self.exclude_topics = exclude_topics
+        self.topic_cap = topic_cap
+        self.other_cap = other_cap
+        self.max_stories = max_stories
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+
+        # The score without impact: recency, NewsAPI rank and the repeat penalty
+        self.base_scores = []
+        for position, article_data in enumerate(candidates):
+            published = parse_published_at(article_data.get('published_at'))
+            if published and RECENCY_HALF_LIFE_HOURS > 0:
+                age_hours = max(0.0, (now - published).total_seconds() / 3600)
+                recency = 0.5 ** (age_hours / RECENCY_HALF_LIFE_HOURS)
+            else:
+                recency = 0.5
+            prominence = 1 - position / len(candidates)
+            self.base_scores.append(recency + prominence - (REPEAT_PENALTY if article_data.get('repeat') else 0))
+        # The best score each candidate could reach, best first
+        self.bounds = {article_data['headline']: base + MAX_IMPACT for article_data, base in zip(candidates, self.base_scores)}
+        self.by_bound = sorted(self.bounds, key=self.bounds.get, reverse=True)
+        self.sources = {article_data['headline']: article_data['source'] for article_data in candidates}
+
+        # Topics the edition carries; unrecognized ones go to "Other" (max other_cap)
+        self.buckets = {topic for topic in TOPICS if self.allowed(topic)}
+        if include_topics is not None and any(topic not in TOPICS for topic in include_topics):
+            self.buckets.add("Other")
+
+    @classmethod
+    def for_edition(cls, edition, candidates):
+        return cls(
+            candidates,
+            include_topics=edition.get('include_topics'),
+            exclude_topics=edition.get('exclude_topics', ()),
+            topic_cap=edition.get('topic_cap', 10),
+            other_cap=edition.get('other_cap', 8),
+            max_stories=edition.get('max_stories', MAX_STORIES)
+        )
 
-    # 5. Sort into categories with strict limits
-    if topic in grouped_headlines and len(grouped_headlines[topic]) < 10:
-        grouped_headlines[topic].append(article_data)
-    elif topic not in grouped_headlines:
-        # Only completely unrecognized topics spill into "Other" (max 8)
-        if len(grouped_headlines["Other"]) < 8:
-            grouped_headlines["Other"].append(article_data)
+    def allowed(self, topic):
+        return (self.include_topics is None or topic in self.include_topics) and topic not in self.exclude_topics
+
+    def budget(self, limit=None):
+        limits = [value for value in (limit, self.max_stories) if value]
+        return min(limits) if limits else None
+
+    def rank(self, topics, impacts, limit=None):
+        """
+        Returns [(score, candidate index, topic)] for the chosen stories, best first, from the
+        candidates labeled in `topics` (headline -> category, None while pending).
+        Lazy greedy over one heap: a popped story whose score has dropped since it was pushed
+        (its source was picked in the meantime) goes back in at its new score.
+        """
+        budget = self.budget(limit)
+        heap = []
+        for i, article_data in enumerate(self.candidates):
+            topic = topics.get(article_data['headline'])
+            if topic is not None and self.allowed(topic):
+                impact = impacts.get(article_data['headline']) or DEFAULT_IMPACT
+                heap.append((-(self.base_scores[i] + impact), i, impact))
+        heapq.heapify(heap)
+
+        chosen = []
+        per_topic = collections.Counter()
+        per_source = collections.Counter()
+        while heap and (budget is None or len(chosen) < budget):
+            negative_score, i, impact = heapq.heappop(heap)
+            article_data = self.candidates[i]
+            topic = topics[article_data['headline']]
+            bucket = topic if topic in TOPICS else "Other"
+            if per_topic[bucket] >= (self.topic_cap if bucket == topic else self.other_cap):
+                continue
+            score = self.base_scores[i] + impact - SOURCE_DIVERSITY_PENALTY * per_source[article_data['source']]
+            if heap and score < -heap[0][0] and score < -negative_score:
+                heapq.heappush(heap, (-score, i, impact))
+                continue
+            chosen.append((score, i, bucket))
+            per_topic[bucket] += 1
+            per_source[article_data['source']] += 1
+        return chosen
+
+    def select(self, topics, impacts, limit=None):
+        """
+        Returns grouped_headlines for the chosen stories, best first within each topic.
+        """
+        grouped_headlines = {topic: [] for topic in TOPICS}
+        for _, i, bucket in self.rank(topics, impacts, limit):
+            grouped_headlines[bucket].append(self.candidates[i])
+        return grouped_headlines
+
+    def settled(self, topics, impacts, limit=None):
+        """
+        True when no candidate still unlabeled could change the selection: the post (or every topic
+        it carries) is full, and even with a top impact score the best unlabeled story from each
+        source would be passed over for every story already chosen, counting the diversity penalty
+        it would pay for the ones from its own source picked ahead of it.
+        """
+        best_pending = {}
+        for headline in self.by_bound:
+            if topics.get(headline) is None:
+                best_pending.setdefault(self.sources[headline], self.bounds[headline])
+        if not best_pending:
+            return True
+        chosen = self.rank(topics, impacts, limit)
+        budget = self.budget(limit)
+        per_topic = collections.Counter(bucket for _, _, bucket in chosen)
+        if not ((budget is not None and len(chosen) >= budget) or all(per_topic[bucket] >= self.topic_cap for bucket in self.buckets)):
+            return False
+        for source, bound in best_pending.items():
+            picked_ahead = 0
+            for score, i, _ in chosen:
+                if score <= bound - SOURCE_DIVERSITY_PENALTY * picked_ahead:
+                    return False
+                picked_ahead += self.candidates[i]['source'] == source
+        return True
+
+# --- Links ---
+# Links are canonicalized offline as soon as articles come in: Google News, AMP and redirect wrappers
+# are unwrapped and tracking parameters dropped. The links that make it into a post are then checked over
+# HTTP (HEAD, or a GET if the site refuses HEAD) by up to LINK_MAX_WORKERS requests at a time, following
+# redirects to the final address; dead ones (404 or 410) are swapped for the next candidate, after
+# trying the link as the feed gave it in case the cleanup is what broke it.
+# Results are kept in LINK_CACHE_PATH, good links for LINK_CACHE_TTL and dead ones for LINK_DEAD_TTL,
+# so recurring links aren't checked again. LINK_CHECK=off skips the HTTP part.
+LINK_CHECK = os.environ.get("LINK_CHECK", "on").lower() != "off"
+LINK_MAX_WORKERS = int(os.environ.get("LINK_MAX_WORKERS", 8))
+LINK_TIMEOUT = 10 # Seconds
+LINK_CACHE_PATH = os.environ.get("LINK_CACHE_PATH", ".cache/links.sqlite3")
+LINK_CACHE_TTL = int(os.environ.get("LINK_CACHE_TTL", 7 * 24 * 3600)) # Seconds
+LINK_DEAD_TTL = int(os.environ.get("LINK_DEAD_TTL", 6 * 3600)) # Seconds; a dead link may only be down for a while
+TRACKING_PARAM_PREFIXES = ("utm_", "at_", "mc_", "pk_", "guce_")
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "twclid", "ocid", "cmpid", "smid", "smtyp",
+    "taid", "ref", "ref_src", "referrer", "sr_share", "guccounter", "_ga", "_gl"
+}
+# Sites whose AMP pages are the normal page plus /amp (or .amp) in the path, or an amp/outputType query
+# parameter; on other hosts those could be part of a real address, so they are left alone
+LINK_AMP_HOSTS = [host.strip().lower() for host in os.environ.get(
+    "LINK_AMP_HOSTS", "cnbc.com,usatoday.com,nbcnews.com,foxnews.com,nypost.com,bbc.com,bbc.co.uk,reuters.com,washingtonpost.com"
+).split(",") if host.strip()]
+LINK_USER_AGENT = "Mozilla/5.0 (compatible; CowSaysDailyNews link checker)"
+
+def on_domain(host, domain):
+    """
+    True if the host is the domain or one of its subdomains ("news.google.com", not "notgoogle.com").
+    """
+    return host == domain or host.endswith("." + domain)
 
-print("Classification complete.")
+def decode_google_news_link(article_id):
+    """
+    Returns the article URL inside a Google News article ID, or None if it can't be read offline.
+    Older IDs are a base64 protobuf holding the URL as field 4; newer ones ("AU_yqL...") are opaque.
+    """
+    try:
+        data = base64.urlsafe_b64decode(article_id + "=" * (-len(article_id) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    if not data.startswith(b"\x08\x13\x22"):
+        return None
+    # The URL's length follows as a varint
+    length, shift, position = 0, 0, 3
+    while position < len(data):
+        byte = data[position]
+        length |= (byte & 0x7f) << shift
+        position += 1
+        shift += 7
+        if not byte & 0x80:
+            break
+    url = data[position:position + length].decode("utf-8", errors="replace")
+    return url if url.startswith(("http://", "https://")) else None
+
+def is_tracking_param(key, value, amp_host):
+    key = key.lower()
+    if key.startswith(TRACKING_PARAM_PREFIXES) or key in TRACKING_PARAMS:
+        return True
+    return amp_host and (key in ("amp", "outputtype") or (key == "output" and value.lower() == "amp"))
+
+def canonicalize_url(url):
+    """
+    Returns the link without wrappers, tracking parameters or fragment. Needs no network.
+    Everything else in the query is kept exactly as the site wrote it.
+    """
+    url = url.replace("\\u003d", "=").replace("\\u0026", "&")
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    query = parse_qsl(parsed.query, keep_blank_values=True)
+
+    # Google News links wrap the article in an encoded ID: news.google.com/rss/articles/<id>
+    news_article = re.match(r"^(?:/__i/rss/rd|/rss)?/articles/([A-Za-z0-9_-]+)$", parsed.path)
+    if host == "news.google.com" and news_article:
+        target = decode_google_news_link(news_article.group(1))
+        if target:
+            return canonicalize_url(target)
+    # Redirect wrappers carry the real link in a query parameter
+    if (on_domain(host, "google.com") and parsed.path == "/url") or host in ("l.facebook.com", "lm.facebook.com"):
+        target = dict(query).get('q') or dict(query).get('url') or dict(query).get('u')
+        if target and target.startswith(("http://", "https://")):
+            return canonicalize_url(target)
+    # AMP caches: google.com/amp/s/example.com/page and example-com.cdn.ampproject.org/c/s/example.com/page
+    amp = re.match(r"^/(?:amp|c)/(s/)?(.+)$", parsed.path)
+    if amp and (on_domain(host, "google.com") or host.endswith(".cdn.ampproject.org")):
+        return canonicalize_url(("https://" if amp.group(1) else "http://") + amp.group(2) + (f"?{parsed.query}" if parsed.query else ""))
+
+    amp_host = any(on_domain(host, amp_domain) for amp_domain in LINK_AMP_HOSTS)
+    path = parsed.path
+    if amp_host:
+        path = re.sub(r"^/amp(?=/)|/amp/?$|\.amp(?=\.html?$)", "", path) or "/"
+    # Only whole key=value pairs are dropped, so "?123456" or "?x=1;y=2" come through untouched
+    kept = []
+    for pair in parsed.query.split("&"):
+        key, _, value = pair.partition("=")
+        if pair and not is_tracking_param(unquote_plus(key), unquote_plus(value), amp_host):
+            kept.append(pair)
+    netloc = parsed.netloc.lower() if not parsed.username else parsed.netloc
+    return urlunparse((parsed.scheme.lower(), netloc, path, parsed.params, "&".join(kept), ""))
+
+class LinkCache:
+    """
+    On-disk url -> canonical url cache. A NULL canonical marks a dead link.
+    Only used from the main thread, like ClassificationCache.
+    """
+    def __init__(self, path):
+        self.db = None
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS links (url TEXT PRIMARY KEY, canonical TEXT, status INTEGER, checked_at REAL NOT NULL)")
+            with self.db:
+                self.db.execute(
+                    "DELETE FROM links WHERE checked_at < ? OR (canonical IS NULL AND checked_at < ?)",
+                    (time.time() - LINK_CACHE_TTL, time.time() - LINK_DEAD_TTL)
+                )
+        except sqlite3.Error as e:
+            print(f"Warning: Could not open link cache '{path}': {e}. Continuing without it.")
+            self.db = None
+
+    def get_many(self, urls):
+        """
+        Returns {url: canonical or None} for the urls checked recently enough.
+        """
+        if not self.db or not urls:
+            return {}
+        found = {}
+        now = time.time()
+        for url, canonical, checked_at in self.db.execute(
+            f"SELECT url, canonical, checked_at FROM links WHERE url IN ({','.join('?' * len(urls))})", list(urls)
+        ):
+            if now - checked_at < (LINK_CACHE_TTL if canonical else LINK_DEAD_TTL):
+                found[url] = canonical
+        return found
+
+    def put_many(self, results):
+        """
+        Stores a list of (url, canonical or None, status) results.
+        """
+        if not self.db or not results:
+            return
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO links (url, canonical, status, checked_at) VALUES (?, ?, ?, ?)",
+                [(url, canonical, status, now) for url, canonical, status in results]
+            )
+
+@functools.lru_cache(maxsize=None)
+def get_link_cache():
+    return LinkCache(LINK_CACHE_PATH)
+
+@functools.lru_cache(maxsize=None)
+def get_link_session():
+    """
+    One pooled session for link checks, sized to the worker pool.
+    """
+    session = requests.Session()
+    session.headers.update({'User-Agent': LINK_USER_AGENT})
+    adapter = requests.adapters.HTTPAdapter(pool_connections=LINK_MAX_WORKERS, pool_maxsize=LINK_MAX_WORKERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def check_link(url):
+    """
+    Follows a link's redirects. Returns (url, canonical url or None if dead, status), or
+    None if the answer says nothing either way (timeouts, 403s from bot walls, 5xx), in
+    which case the link is kept as it is and not cached.
+    """
+    session = get_link_session()
+    try:
+        response = session.head(url, allow_redirects=True, timeout=LINK_TIMEOUT)
+        run_metrics.record_http(response)
+        if response.status_code in (403, 405, 501) or response.status_code >= 500:
+            # Plenty of sites don't answer HEAD properly, so ask again with a GET (without reading the body)
+            with session.get(url, allow_redirects=True, timeout=LINK_TIMEOUT, stream=True) as response:
+                run_metrics.record(calls=1)
+    except requests.exceptions.RequestException:
+        # Connection trouble on our side must not empty the post, so only an answer counts as dead
+        return None
+
+    if response.status_code in (404, 410):
+        return url, None, response.status_code
+    if response.status_code >= 400:
+        return None
+    # A link that works as it is stays as it is; only where it redirected to is cleaned up
+    return url, canonicalize_url(response.url) if response.history else url, response.status_code
+
+def resolve_links(urls):
+    """
+    Returns {url: canonical url, or None if the link is dead} for every url, from the cache
+    where possible and otherwise checked concurrently.
+    """
+    resolved = {url: url for url in urls}
+    if not LINK_CHECK or not urls:
+        return resolved
+    link_cache = get_link_cache()
+    cached = link_cache.get_many(set(urls))
+    resolved.update(cached)
+    unchecked = list(dict.fromkeys(url for url in urls if url not in cached))
+    run_metrics.record(cache_hits=len(cached))
+    print(f"Checking {len(unchecked)} link(s) ({len(cached)} cached)...")
+
+    with ThreadPoolExecutor(max_workers=LINK_MAX_WORKERS) as pool:
+        results = [result for result in pool.map(check_link, unchecked) if result]
+    for url, canonical, status in results:
+        resolved[url] = canonical
+        if canonical is None:
+            print(f"-> Dead link ({status}): {url}")
+    link_cache.put_many(results)
+    return resolved
+
+def select_headlines(edition, candidates, topics_by_headline, impacts_by_headline):
+    """
+    Picks an edition's stories and checks their links, replacing dead ones with the
+    next best candidates and every other link with its canonical address. A story whose
+    cleaned-up link is dead gets its link as the feed gave it tried before it is dropped.
+    """
+    dead_urls = set()
+    while True:
+        live = []
+        for article_data in candidates:
+            if article_data['url'] in dead_urls:
+                original_url = article_data.get('original_url')
+                if not original_url or original_url in dead_urls:
+                    continue
+                article_data = dict(article_data, url=original_url)
+            live.append(article_data)
+        grouped_headlines = StorySelector.for_edition(edition, live).select(topics_by_headline, impacts_by_headline)
+        resolved = resolve_links([article_data['url'] for articles in grouped_headlines.values() for article_data in articles])
+        newly_dead = {url for url, canonical in resolved.items() if canonical is None}
+        if not newly_dead:
+            break
+        dead_urls |= newly_dead
+
+    return {
+        topic: [
+            {key: value for key, value in dict(article_data, url=resolved[article_data['url']]).items() if key != 'original_url'}
+            for article_data in articles
+        ]
+        for topic, articles in grouped_headlines.items()
+    }
 
 
 ## STEP 3 - Punny Title ##
 ##########################
 
+# Several titles are generated at once and the best is kept, judged locally so picking costs no extra call.
+TITLE_CANDIDATES = int(os.environ.get("TITLE_CANDIDATES", 3))
+# Title generation starts as soon as this many of an edition's top headlines are classified,
+# while the rest are still in flight. Set to 0 to wait for classification to finish instead.
+TITLE_EARLY_HEADLINES = int(os.environ.get("TITLE_EARLY_HEADLINES", 15))
+GENERIC_TITLE_PHRASES = ("global tensions", "markets brace")
+TITLE_FALLBACK = "Daily News: Your Daily Dose of Moo-sings"
+
+def enforce_title_prefix(title, title_prefix):
+    """
+    Cleans up a generated title and makes sure it starts with the required prefix,
+    swapping out a wrong one (e.g. another day's) rather than asking Gemini again.
+    Returns (title, whether Gemini got the prefix right itself).
+    """
+    title = title.strip().strip("*").strip()
+    # Clean up quotes if the model wraps the title in them
+    if len(title) > 1 and title[0] == title[-1] and title[0] in "\"'":
+        title = title[1:-1].strip()
+    if title.lower().startswith(title_prefix.lower()):
+        return title_prefix + title[len(title_prefix):], True
+    title = re.sub(r"^(\w+ )?(Edition|Daily News):\s*", "", title, flags=re.IGNORECASE)
+    return f"{title_prefix} {title}", False
+
+def score_title(title, had_prefix, headlines):
+    """
+    Ranks candidate titles the way the prompt asks for them: the right prefix, a reference to
+    one or two actual headlines, no stock phrases, and short enough to read at a glance.
+    """
+    words = set(re.findall(r"[a-z0-9']{4,}", title.lower()))
+    referenced = sum(1 for headline in headlines if words & set(re.findall(r"[a-z0-9']{4,}", headline.lower())))
+    score = 2 * had_prefix + min(referenced, 2)
+    score -= 2 * sum(phrase in title.lower() for phrase in GENERIC_TITLE_PHRASES)
+    if len(title) > 100:
+        score -= 1
+    return score
+
+def generate_title_candidate(prompt):
+    """
+    Returns one raw title from Gemini, or None if the call failed.
+    """
+    try:
+        # Booked to "title" even when it runs early, during classification
+        response = generate_content(prompt, get_safety_config(), kind="title", stage="title")
+        return response.text
+    except Exception as e:
+        print(f"Error generating punny title: {e}")
+        return None
+
 def get_punny_title(grouped_headlines):
     """
-    Uses Gemini to create a punny title based on the summary and today's date. 
+    Uses Gemini to create a punny title based on the summary and today's date.
+    TITLE_CANDIDATES titles are generated concurrently, given the required prefix, and the best one kept.
     """
     print("Generating punny post title...")
     
@@ -286,313 +1846,983 @@ def get_punny_title(grouped_headlines):
     Now, create the title based on this collection of news headlines.
     {headline_input}
     """
-    try:
-        # UPDATED: Use client.models.generate_content and the new model ID
-        response = client.models.generate_content(
-            model='gemini-3.1-flash-lite',
-            contents=full_prompt, 
-            config=safety_config
-        )
-        time.sleep(1)
-        
-        # Clean up quotes if the model wraps the title in them
-        title = response.text.strip()
-        if title.startswith('"') and title.endswith('"'):
-            title = title[1:-1]
-            
-        return title
-    
-    except Exception as e:
-        print(f"Error generating punny title: {e}")
-        return f"Daily News: Your Daily Dose of Moo-sings" # Fallback generic title
+    count = max(1, TITLE_CANDIDATES)
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        raw_titles = [title for title in pool.map(generate_title_candidate, [full_prompt] * count) if title and title.strip()]
+    if not raw_titles:
+        return TITLE_FALLBACK # Fallback generic title
+
+    headlines = [article['headline'] for articles in grouped_headlines.values() for article in articles]
+    candidates = [enforce_title_prefix(title, title_prefix) for title in raw_titles]
+    # max() keeps the first of equally good titles
+    title, _ = max(candidates, key=lambda candidate: score_title(candidate[0], candidate[1], headlines))
+    if len(candidates) > 1:
+        print(f"Picked the best of {len(candidates)} candidate titles.")
+    return title
+
+class TitleSpeculator:
+    """
+    Starts each edition's title while classification is still running. Once an edition's top
+    TITLE_EARLY_HEADLINES stories are settled (no headline still being classified could outrank
+    them), the title is generated from them in the background; run_edition() then only has to
+    collect it. Editions that never get that far title themselves as before, and so does an
+    edition whose link check swapped out one of the stories its early title was written from.
+    """
+    def __init__(self, editions, candidates_by_country, headlines):
+        self.editions = [edition for edition in editions if TITLE_EARLY_HEADLINES > 0]
+        self.selectors = {
+            edition['name']: StorySelector.for_edition(edition, candidates_by_country.get(edition['country'], []))
+            for edition in self.editions
+        }
+        self.headlines = headlines
+        self.titles = {}
+        self.pool = ThreadPoolExecutor(max_workers=max(1, len(self.editions)))
+
+    def update(self, topics, impacts):
+        """
+        The on_labeled callback for get_news_topics().
+        """
+        topics_by_headline = dict(zip(self.headlines, topics))
+        impacts_by_headline = dict(zip(self.headlines, impacts))
+        for edition in self.editions:
+            selector = self.selectors[edition['name']]
+            if edition['name'] in self.titles or not selector.settled(topics_by_headline, impacts_by_headline, TITLE_EARLY_HEADLINES):
+                continue
+            grouped = selector.select(topics_by_headline, impacts_by_headline, TITLE_EARLY_HEADLINES)
+            if not any(grouped.values()):
+                self.titles[edition['name']] = None # Nothing to title; the edition is skipped or titled later
+                continue
+            print(f"Top headlines for edition '{edition['name']}' are settled, generating its title early...")
+            titled = {article_data['headline'] for articles in grouped.values() for article_data in articles}
+            self.titles[edition['name']] = (self.pool.submit(get_punny_title, grouped), titled)
+
+    def title(self, name, grouped_headlines):
+        """
+        Waits for and returns the edition's early title, or None if it wasn't started or
+        names a story that isn't in the final grouped_headlines.
+        """
+        if not self.titles.get(name):
+            return None
+        future, titled = self.titles[name]
+        published = {article_data['headline'] for articles in grouped_headlines.values() for article_data in articles}
+        if not titled <= published:
+            print(f"Stories behind the early title for edition '{name}' changed, titling it again.")
+            future.cancel()
+            return None
+        return future.result()
+
+    def close(self):
+        self.pool.shutdown()
 
-# Execution of Step 3
-punny_title = get_punny_title(grouped_headlines)
-print(f"Punny title generated: '{punny_title}'")
 
 
 ## Step 4 - Build "CowSay" format ##
 ####################################
 
-print("Generating modern HTML summary...")
+# The page skeleton, CSS and cow art live in templates/ and are read and pre-filled once per process.
+# The kg-card comments around the page are needed for Ghost wrapping and conversion into lexical format.
+# Set HTML_MINIFY_CSS=1 to strip comments and whitespace from the inlined CSS.
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+HTML_MINIFY_CSS = os.environ.get("HTML_MINIFY_CSS", "").lower() in ("1", "true", "yes")
+
+TOPIC_TEMPLATE = string.Template("    <h3>$topic</h3>\n    <ul>\n")
+ARTICLE_TEMPLATE = string.Template(
+    '      <li>\n'
+    '        <a href="$url" target="_blank">$headline</a> - \n'
+    '        <span class="source"> ($source)</span>\n'
+    '      </li>\n'
+)
 
-def create_html_summary(grouped_headlines):
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{}:;,>])\s*", r"\1", css).replace(";}", "}").strip()
+
+@functools.lru_cache(maxsize=None)
+def load_post_template():
     """
-    Formats the grouped headlines and the daily summary into a self-contained
-    HTML/CSS block that looks like a modern cowsay post.
+    Reads the templates once and fills in the static parts.
+    Returns the page split into the (head, tail) around the headline sections.
     """
+    def read(name):
+        with open(os.path.join(TEMPLATE_DIR, name), encoding="utf-8") as template_file:
+            return template_file.read()
+
+    css = read("cow-post.css")
+    if HTML_MINIFY_CSS:
+        css = minify_css(css)
+    head, tail = read("cow-post.html").split("$sections\n")
+    return (
+        string.Template(head).substitute(css=css.rstrip("\n")),
+        string.Template(tail).substitute(cow_art=html.escape(read("cow-art.txt")))
+    )
+
+def write_html_summary(grouped_headlines, out):
+    """
+    Streams the post HTML into a file-like object one article at a time, so big editions
+    and archive rebuilds don't have to build the whole document in memory.
+    """
+    head, tail = load_post_template()
+    out.write(head)
 
-    # Build the HTML and CSS as a single string.
-    html_parts = []
-
-    # --- The CSS (inline <style> block) ---
-    html_parts.append('<!--kg-card-begin: html-->') #Needed for Ghost wrapping and conversion into lexicon format
-    html_parts.append("""
-    <style>
-        .cow-post {
-            max-width: 700px;
-            margin: 0;
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
-            line-height: 1.6;
-        }
-        .cow-post-donate {
-            max-width: 700px;
-            margin: 1em auto;
-            padding-top: 20px; 
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
-            line-height: 1.6;
-        }
-        .cow-post .speech-bubble {
-            background-color: #f8f9fa;
-            border: 2px solid #dee2e6;
-            border-radius: 15px;
-            padding: 1.5em;
-            position: relative;
-            margin-top: 0;
-            margin-bottom: 1.5em;
-            box-shadow: 0 4px 12px rgba(0,0,0,0.05);
-        }
-        /* The "tail" of the speech bubble */
-        .cow-post .speech-bubble::after {
-            content: '';
-            position: absolute;
-            bottom: -30px; /* Was -20px */
-            left: 60px; /* Unchanged, adjust if you want to move it left/right */
-            border-width: 30px 30px 30px 30px; /* Was 20px 20px 0 0 */
-            border-style: solid;
-            border-color: #f8f9fa transparent transparent transparent;
-            filter: drop-shadow(0 3px 0 #dee2e6);
-            transform: rotate(-135deg);
-        }
-        .cow-post h2 {
-            font-size: 1.8em;
-            margin-top: 0;
-            color: #212529;
-        }
-        .cow-post h3 {
-            font-size: 1.3em;
-            border-bottom: 2px solid #e9ecef;
-            padding-bottom: 5px;
-            margin-top: 0;
-            color: #495057;
-        }
-        .cow-post ul {
-            list-style-type: none;
-            padding-left: 0;
-            padding-bottom: 15px;
-        }
-        .cow-post li {
-            margin-bottom: 0.8em;
-            padding-left: 1.2em;
-            position: relative;
-        }
-        /* A "bullet" for the list */
-        .cow-post li::before {
-            content: '🐮';
-            position: absolute;
-            left: 0;
-            top: 0;
-            font-size: 0.8em;
-        }
-        .cow-post a {
-            text-decoration: none;
-            font-weight: 500;
-            color: #007bff;
-        }
-        .cow-post-donate a {
-            text-decoration: none;
-            font-weight: 500;
-            color: #007bff;
-        }
-        .cow-post a:hover {
-            text-decoration: underline;
-        }
-        .cow-post-donate a:hover {
-            text-decoration: underline;
-        }
-        .cow-post .source {
-            font-size: 0.9em;
-            color: #6c757d;
-        }
-        .cow-post .cow-art {
-            font-family: monospace, monospace;
-            font-size: 1em;
-            color: #495057;
-            line-height: 1.2;
-            text-align: left;
-            /* Move cow to the left */
-            white-space: pre;
-        }
-    </style>
-    """)
-
-    # --- HTML Structure --- #
-    html_parts.append('<div class="cow-post">')
-    html_parts.append('  <div class="speech-bubble">')
-    
     # Loop through topics and build HTML lists
     for topic, articles in grouped_headlines.items():
         if articles:
             # html.escape() is important to prevent HTML-injection issues
-            html_parts.append(f"    <h3>{html.escape(topic.upper())}</h3>")
-            html_parts.append("    <ul>")
+            out.write(TOPIC_TEMPLATE.substitute(topic=html.escape(topic.upper())))
             for article in articles:
                 # Sanitize all user-facing data
-                print(f"Original URL: {article['url']}")
-                safe_url = html.escape(article['url']).replace(r'\\u003d', '=')
-                print(f"Sanitized URL:{safe_url}")
-                safe_headline = html.escape(article['headline'])
-                safe_source = html.escape(article['source'])
+                out.write(ARTICLE_TEMPLATE.substitute(
+                    url=html.escape(article['url']).replace(r'\\u003d', '='),
+                    headline=html.escape(article['headline']),
+                    source=html.escape(article['source'])
+                ))
+            out.write("    </ul>\n")
 
-                html_parts.append("      <li>")
-                html_parts.append(f'        <a href="{safe_url}" target="_blank">{safe_headline}</a> - ')
-                html_parts.append(f'        <span class="source"> ({safe_source})</span>')
-                html_parts.append("      </li>")
-            html_parts.append("    </ul>")
+    out.write(tail)
 
-    html_parts.append('  </div>') # Close .speech-bubble
+def create_html_summary(grouped_headlines):
+    """
+    Formats the grouped headlines into a self-contained HTML/CSS block that looks like a modern cowsay post.
+    """
+    buffer = io.StringIO()
+    write_html_summary(grouped_headlines, buffer)
+    return buffer.getvalue()
 
-    # Add the cow (in a <pre> tag to preserve formatting)
-    
-    cow_ascii = r"""
-< Thanks, this has been   >
-< Will MaCowvoy reporting >
- --------------------------
-        \   ^__^
-         \  (oo)\_______
-            (__)\       )\/\
-                ||----w |
-                ||     ||
-"""
-    html_parts.append(f'  <pre class="cow-art">{html.escape(cow_ascii)}</pre>')
-    html_parts.append('</div>') # Close .cow-post
 
-    # Donation link in case anyone wants to help support 
-    html_parts.append(""" 
-    <div class="cow-post-donate">
-      <a href="https://www.buymeacoffee.com/vanberge">🐮 Support the News!</a>
-    </div>
-    """)
-    html_parts.append('<!--kg-card-end: html-->') # Ghost wrapper closing
+## Step 5 - Post it to Ghost ##
+###############################
 
-    return "\n".join(html_parts)
+GHOST_MAX_RETRIES = int(os.environ.get("GHOST_MAX_RETRIES", 4))
+GHOST_TOKEN_LIFETIME = 300 # Seconds, the most Ghost allows for Admin API tokens
+GHOST_TOKEN_REFRESH_MARGIN = 60 # Re-sign the token when it has less than this left
 
-# --- Function call to include the summary ---
-html_content_for_ghost = create_html_summary(grouped_headlines)
+class GhostConflictError(Exception):
+    """
+    Raised when a post update keeps hitting 409 conflicts after refreshing updated_at.
+    """
 
-# To test the output, uncomment the line below
-# print(html_content_for_ghost)
-print("HTML summary generated.")
+def connection_never_made(error):
+    """
+    True if a request failed before a connection to the server existed, so it can't have been
+    received. requests also raises ConnectionError when an open connection drops mid-request
+    (after the server may have processed it), which doesn't count.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or not error.args:
+        return False
+    cause = getattr(error.args[0], 'reason', error.args[0]) # requests wraps urllib3's MaxRetryError
+    return isinstance(cause, NewConnectionError)
+
+class GhostAdminClient:
+    """
+    Minimal Ghost Admin API client.
+    Reuses one keep-alive session, re-signs its JWT shortly before it expires, puts a timeout
+    on every call and retries 429 and 5xx responses with backoff. POSTs are only retried when
+    the request can't have been processed (a 429, or a connection that was never made) so a
+    retry never creates a second post.
+    """
+    def __init__(self, ghost_url, admin_api_key, timeout=HTTP_TIMEOUT, max_retries=GHOST_MAX_RETRIES):
+        try:
+            self.key_id, key_secret = admin_api_key.split(':')
+            self.key_secret = bytes.fromhex(key_secret)
+        except ValueError:
+            raise ValueError("ADMIN_API_KEY is not in the correct 'id:secret' format.")
+        self.base_url = f"{ghost_url.rstrip('/')}/ghost/api/admin"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.token = None
+        self.token_expires = 0
+
+    def auth_headers(self):
+        """
+        Returns the Authorization header, signing a fresh JWT if the current one is about to expire.
+        """
+        now = int(time.time())
+        if self.token is None or now >= self.token_expires - GHOST_TOKEN_REFRESH_MARGIN:
+            header = {'alg': 'HS256', 'typ': 'JWT', 'kid': self.key_id}
+            payload = {
+                'iat': now,
+                'exp': now + GHOST_TOKEN_LIFETIME,
+                'aud': '/admin/'
+            }
+            self.token = jwt.encode(payload, self.key_secret, algorithm='HS256', headers=header)
+            self.token_expires = now + GHOST_TOKEN_LIFETIME
+        return {'Authorization': f'Ghost {self.token}'}
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends one Admin API request with retries. Returns the last response, or re-raises
+        the last connection error if no response ever came back.
+        """
+        url = f"{self.base_url}{path}"
+        for attempt in range(1, self.max_retries + 1):
+            response = None
+            try:
+                response = self.session.request(method, url, headers=self.auth_headers(), timeout=self.timeout, **kwargs)
+                run_metrics.record_http(response)
+                retryable = response.status_code == 429 or (response.status_code >= 500 and method != "POST")
+                if not retryable:
+                    return response
+                problem = f"{response.status_code} - {response.text[:200]}"
+            except requests.exceptions.RequestException as e:
+                # A POST that may have reached the server must not be repeated
+                if attempt == self.max_retries or (method == "POST" and not connection_never_made(e)):
+                    raise
+                problem = str(e)
+
+            if attempt == self.max_retries:
+                return response
+            run_metrics.record(retries=1)
+            delay = backoff_delay(attempt, response)
+            print(f"Ghost {method} {path} failed ({problem}), retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+
+    def get_newsletters(self):
+        return self.request("GET", "/newsletters/")
+
+    def get_post(self, post_id):
+        return self.request("GET", f"/posts/{post_id}/")
+
+    def find_posts(self, nql_filter):
+        return self.request("GET", "/posts/", params={'filter': nql_filter, 'limit': 'all', 'fields': 'id,title,status,updated_at,url'})
+
+    def create_post(self, post, params=None):
+        return self.request("POST", "/posts/", params=dict({'source': 'html'}, **(params or {})), json={'posts': [post]})
+
+    def update_post(self, post_id, changes, updated_at, params=None, max_conflicts=3):
+        """
+        PUTs changes to a post. Ghost rejects updates whose updated_at doesn't match the server
+        copy with a 409; when that happens the current updated_at is fetched and the update retried.
+        """
+        for _ in range(max_conflicts):
+            response = self.request("PUT", f"/posts/{post_id}/", params=params, json={'posts': [dict(changes, updated_at=updated_at)]})
+            if response.status_code != 409:
+                return response
+            print(f"Post {post_id} changed on the server (409), refreshing updated_at and retrying...")
+            current = self.get_post(post_id)
+            current.raise_for_status()
+            updated_at = current.json()['posts'][0]['updated_at']
+        raise GhostConflictError(f"Post {post_id} still conflicts after {max_conflicts} attempts.")
+
+@functools.lru_cache(maxsize=None)
+def get_ghost_client():
+    return GhostAdminClient(require_env("GHOST_URL"), require_env("ADMIN_API_KEY"))
+
+# --- Newsletter discovery cache ---
+# The active newsletter almost never changes, so its slug is remembered for GHOST_NEWSLETTER_CACHE_TTL
+# seconds instead of listing every newsletter on every run.
+GHOST_NEWSLETTER_CACHE_PATH = os.environ.get("GHOST_NEWSLETTER_CACHE_PATH", ".cache/ghost-newsletter.json")
+GHOST_NEWSLETTER_CACHE_TTL = int(os.environ.get("GHOST_NEWSLETTER_CACHE_TTL", 7 * 24 * 3600)) # Seconds
+
+# "draft" is the original two-step flow: create a draft, then publish and email it.
+# "direct" creates the post already published in a single request. Ghost may only honor the
+# newsletter and email options when editing a post, so verify it emails on your instance before
+# switching: a direct post that comes back without an email object fails the run, since a post
+# that is already published can't be emailed afterwards. Direct mode falls back to the draft flow
+# if Ghost rejects the one-shot request.
+GHOST_PUBLISH_MODE = os.environ.get("GHOST_PUBLISH_MODE", "draft").lower()
+
+def forget_newsletter_slug():
+    try:
+        os.remove(GHOST_NEWSLETTER_CACHE_PATH)
+    except OSError:
+        pass
 
+def get_newsletter_slug(ghost, refresh=False):
+    """
+    Returns (slug of the first active newsletter, whether it came from the local cache).
+    The cache is used when it is fresh, unless refresh is set.
+    Falls back to "default-newsletter" if Ghost can't be asked.
+    """
+    cache_key = ghost.base_url
+    if refresh and GHOST_NEWSLETTER_CACHE_PATH:
+        forget_newsletter_slug()
+    elif GHOST_NEWSLETTER_CACHE_PATH:
+        try:
+            with open(GHOST_NEWSLETTER_CACHE_PATH, encoding="utf-8") as cache_file:
+                cached = json.load(cache_file)
+            if cached.get('ghost_url') == cache_key and time.time() - cached['fetched_at'] < GHOST_NEWSLETTER_CACHE_TTL:
+                print(f"Using cached newsletter: {cached['slug']}")
+                run_metrics.record(cache_hits=1)
+                return cached['slug'], True
+        except (OSError, ValueError, KeyError):
+            pass
+
+    newsletter_slug = "default-newsletter" # Fallback
+    try:
+        news_response = ghost.get_newsletters()
+
+        if news_response.status_code == 200:
+            news_data = news_response.json()
+            # Find the first active newsletter
+            active_newsletters = [n for n in news_data.get('newsletters', []) if n.get('status') == 'active']
+            if active_newsletters:
+                newsletter_slug = active_newsletters[0]['slug']
+                print(f"found active newsletter: {newsletter_slug}")
+                if GHOST_NEWSLETTER_CACHE_PATH:
+                    os.makedirs(os.path.dirname(GHOST_NEWSLETTER_CACHE_PATH) or ".", exist_ok=True)
+                    with open(GHOST_NEWSLETTER_CACHE_PATH + ".tmp", "w", encoding="utf-8") as cache_file:
+                        json.dump({'ghost_url': cache_key, 'slug': newsletter_slug, 'fetched_at': time.time()}, cache_file)
+                    os.replace(GHOST_NEWSLETTER_CACHE_PATH + ".tmp", GHOST_NEWSLETTER_CACHE_PATH)
+        else:
+            print(f"Warning: Could not fetch newsletters ({news_response.status_code}). Defaulting to '{newsletter_slug}'.")
 
-## Step 5 - Post it to Ghost ##
-###############################
+    except Exception as e:
+        print(f"Warning: Error fetching newsletters: {e}. Defaulting to '{newsletter_slug}'.")
 
-print("Posting to Ghost...")
-
-try:
-    key_id, key_secret = ADMIN_API_KEY.split(':')
-except ValueError:
-    print("Error: ADMIN_API_KEY is not in the correct 'id:secret' format.")
-    sys.exit(1)
-
-# Prepare the JWT Token
-# The token is valid for 5 minutes, sufficient for both requests below.
-iat = int(time.time())
-header = {'alg': 'HS256', 'typ': 'JWT', 'kid': key_id}
-payload = {
-    'iat': iat,
-    'exp': iat + 300,
-    'aud': '/admin/'
-}
-token = jwt.encode(payload, bytes.fromhex(key_secret), algorithm='HS256', headers=header)
+    return newsletter_slug, False
 
-headers = {
-    'Authorization': f'Ghost {token}'
-}
+def report_published(post):
+    # Check if email was actually triggered by inspecting the response
+    email_info = post.get('email')
+    if email_info:
+        print(f"Success! Post published. Email status: {email_info.get('status')} (Recipients: {email_info.get('recipient_count')})")
+    else:
+        print("Post published, but NO email object returned. Please check your Mailgun settings in Ghost Admin.")
 
+    print(f"Post URL: {post.get('url')}")
 
-# STEP 5a - Get the Newsletter Slug #
+def publish_direct(ghost, post, newsletter_slug):
+    """
+    Creates the post already published and emailed, in one request.
+    Returns the response, or None if the request failed before Ghost answered.
+    """
+    print(f"Publishing post to newsletter '{newsletter_slug}'...")
+    try:
+        return ghost.create_post(
+            dict(post, status='published'),
+            params={'newsletter': newsletter_slug, 'email_segment': 'all'} # 'all', or a filter like 'status:free'
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to publish post: {e}")
+        return None
 
-newsletter_slug = "default-newsletter" # Fallback
-try:
-    news_url = f"{GHOST_URL}/ghost/api/admin/newsletters/"
-    news_response = requests.get(news_url, headers=headers)
-    
-    if news_response.status_code == 200:
-        news_data = news_response.json()
-        # Find the first active newsletter
-        active_newsletters = [n for n in news_data.get('newsletters', []) if n.get('status') == 'active']
-        if active_newsletters:
-            newsletter_slug = active_newsletters[0]['slug']
-            print(f"found active newsletter: {newsletter_slug}")
-    else:
-        print(f"Warning: Could not fetch newsletters ({news_response.status_code}). Defaulting to '{newsletter_slug}'.")
+def create_draft(ghost, post, state):
+    """
+    STEP 5b - Creates the post as a draft and checkpoints its ID.
+    Returns (post_id, updated_at), or None if the draft could not be created.
+    """
+    print(f"Creating draft post...")
+    run_metrics.begin("draft")
+    try:
+        draft_response = ghost.create_post(dict(post, status='draft'))
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to create draft: {e}")
+        return None
 
-except Exception as e:
-    print(f"Warning: Error fetching newsletters: {e}. Defaulting to '{newsletter_slug}'.")
+    if draft_response.status_code != 201:
+        print(f"Failed to create draft: {draft_response.status_code} - {draft_response.text}")
+        return None
 
+    draft_json = draft_response.json()
+    post_id = draft_json['posts'][0]['id']
+    state.save('post_id', post_id)
+    print(f"Draft created (ID: {post_id}). Publishing and emailing...")
 
-# STEP 5b - Create Draft Post 
+    # We capture 'updated_at' to prevent conflict errors in the next step
+    return post_id, draft_json['posts'][0]['updated_at']
 
-print(f"Creating draft post...")
-create_url = f"{GHOST_URL}/ghost/api/admin/posts/?source=html"
-author_id = GHOST_AUTHOR 
+def publish_draft(ghost, post_id, updated_at, newsletter_slug, state, slug_cached=False):
+    """
+    STEP 5c - Publishes an existing draft and emails it (Step 2 of 2).
+    If Ghost rejects a newsletter slug that came from the local cache, the slug is looked
+    up again and the publish retried once. Returns True if the post was published.
+    """
+    publish_changes = {
+        'status': 'published',
+        'email_recipient_filter': 'all' # 'all', 'none', or specific filter like 'status:free'
+    }
 
-# Create a payload that uses a single "html" card.
-draft_data = {
-    'posts': [{
+    run_metrics.begin("publish")
+    try:
+        publish_response = ghost.update_post(post_id, publish_changes, updated_at, params={'newsletter': newsletter_slug})
+    except (requests.exceptions.RequestException, GhostConflictError) as e:
+        print(f"Failed to publish/email: {e}")
+        return False
+
+    if publish_response.status_code in (404, 422) and slug_cached:
+        # The newsletter may have been renamed or archived since the slug was cached
+        print(f"Ghost rejected newsletter '{newsletter_slug}' ({publish_response.status_code}), looking it up again...")
+        run_metrics.begin("ghost_newsletters")
+        newsletter_slug, _ = get_newsletter_slug(ghost, refresh=True)
+        return publish_draft(ghost, post_id, updated_at, newsletter_slug, state)
+    if publish_response.status_code != 200:
+        print(f"Failed to publish/email: {publish_response.status_code} - {publish_response.text}")
+        return False
+    state.save('published', True)
+    report_published(publish_response.json()['posts'][0])
+    return True
+
+def find_todays_post(ghost, title):
+    """
+    Looks for a post with this title created in the last day, for resuming a run that died
+    while creating it. Returns the post dict or None.
+    """
+    since = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        response = ghost.find_posts(f"created_at:>'{since}'")
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"Warning: Could not check for an existing post: {e}")
+        return None
+    for post in response.json().get('posts', []):
+        if post.get('title') == title:
+            return post
+    return None
+
+def post_to_ghost(punny_title, html_content_for_ghost, state=None, edition=None):
+    """
+    Publishes the post and emails it to the active newsletter (or the edition's own
+    newsletter), as draft-then-publish, or in one request when GHOST_PUBLISH_MODE is "direct".
+    Progress is checkpointed in `state`, so a resumed run picks up an existing draft
+    instead of creating a second post. Returns False if the post was not published.
+    """
+    print("Posting to Ghost...")
+    state = state or RunState(None)
+    edition = edition or {}
+
+    try:
+        ghost = get_ghost_client()
+        author_id = require_env("GHOST_AUTHOR")
+    except ValueError as e:
+        print(f"Error: {e}")
+        return False
+
+
+    # STEP 5a - Get the Newsletter Slug #
+
+    run_metrics.begin("ghost_newsletters")
+    newsletter_slug, slug_cached = (edition['newsletter'], False) if edition.get('newsletter') else get_newsletter_slug(ghost)
+
+    # Resuming: the post may already exist from an earlier attempt today
+    existing = None
+    if state.get('post_id'):
+        response = ghost.get_post(state.get('post_id'))
+        existing = response.json()['posts'][0] if response.status_code == 200 else None
+    elif state.get('publish_started'):
+        existing = find_todays_post(ghost, punny_title)
+    if existing:
+        state.save('post_id', existing['id'])
+        if existing.get('status') == 'published':
+            print(f"Post {existing['id']} is already published, not posting again.")
+            state.save('published', True)
+            return True
+        print(f"Resuming with existing draft {existing['id']}...")
+        return publish_draft(ghost, existing['id'], existing['updated_at'], newsletter_slug, state, slug_cached)
+
+    # A post that uses a single "html" card.
+    post = {
         # --- Use punny_title ---
-        'title': punny_title, 
+        'title': punny_title,
         'html': html_content_for_ghost,  # Use source?html in call now lets us use it here
         'authors': [  # Set the Author
             { "id": author_id }
-        ], 
-        'status': 'draft'  # Use 'published' to publish immediately
-    }]
-}
-
-# Create the draft
-draft_response = requests.post(create_url, json=draft_data, headers=headers)
-
-if draft_response.status_code != 201:
-    print(f"Failed to create draft: {draft_response.status_code} - {draft_response.text}")
-    sys.exit(1)
-
-draft_json = draft_response.json()
-post_id = draft_json['posts'][0]['id']
-# We capture 'updated_at' to prevent conflict errors in the next step
-updated_at = draft_json['posts'][0]['updated_at']
-
-print(f"Draft created (ID: {post_id}). Publishing and emailing...")
-
-
-# STEP 5c - Publish and Email (Step 2 of 2)
-
-publish_url = f"{GHOST_URL}/ghost/api/admin/posts/{post_id}/?newsletter={newsletter_slug}"
-
-publish_data = {
-    'posts': [{
-        'updated_at': updated_at, # Must match the current server state
-        'status': 'published',
-        'email_recipient_filter': 'all' # 'all', 'none', or specific filter like 'status:free'
-    }]
-}
+        ]
+    }
+    if edition.get('tags'):
+        post['tags'] = [{'name': tag} for tag in edition['tags']]
+
+    # From here on a crash could leave a post behind, which a resumed run must look for
+    state.save('publish_started', True)
+
+    if GHOST_PUBLISH_MODE == "direct":
+        run_metrics.begin("publish")
+        response = publish_direct(ghost, post, newsletter_slug)
+        if response is not None and response.status_code == 201:
+            published = response.json()['posts'][0]
+            state.save('post_id', published['id'])
+            state.save('published', True)
+            report_published(published)
+            if not published.get('email'):
+                # Published but not emailed; posting it again would only duplicate it on the site
+                print("Error: Ghost published the post without emailing it. Use GHOST_PUBLISH_MODE=draft on this instance.")
+                return False
+            return True
+        if response is None or response.status_code not in (400, 404, 422):
+            # Anything other than a clean rejection may have created the post, so don't risk a second one
+            if response is not None:
+                print(f"Failed to publish post: {response.status_code} - {response.text}")
+            return False
+
+        # Ghost refused the one-shot request (e.g. a stale newsletter slug), so nothing was created
+        print(f"Direct publish rejected ({response.status_code} - {response.text}). Falling back to draft-then-publish...")
+        run_metrics.begin("ghost_newsletters")
+        newsletter_slug, slug_cached = (edition['newsletter'], False) if edition.get('newsletter') else get_newsletter_slug(ghost, refresh=True)
+
+    draft = create_draft(ghost, post, state)
+    if not draft:
+        return False
+    return publish_draft(ghost, *draft, newsletter_slug, state, slug_cached)
+
+
+## Run it ##
+############
+
+# Each stage's output is checkpointed to a per-day file here, so `--resume` can skip
+# everything that already finished today (and never posts twice). Dry runs keep their
+# own file, so a preview never touches the checkpoint of the real post.
+RUN_STATE_DIR = os.environ.get("RUN_STATE_DIR", ".cache/runs")
+
+# What a run without --resume still carries over from today's checkpoint: the record of a
+# post that is (or may be) on Ghost already
+PUBLISH_STATE_KEYS = ('publish_started', 'post_id', 'published')
+
+class RunState:
+    """
+    Compact JSON checkpoint of one day's run. A RunState without a path only keeps
+    values in memory (used when posting outside of run_pipeline()).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.data = {}
+
+    @classmethod
+    def for_today(cls, resume, dry_run=False):
+        """
+        Returns today's state: loaded from disk when resuming, otherwise empty apart from
+        what is already on Ghost (and overwriting the rest of today's checkpoint as stages complete).
+        """
+        return cls.for_day(datetime.date.today(), resume, dry_run)
+
+    @classmethod
+    def for_day(cls, day, resume, dry_run=False):
+        date = day.isoformat()
+        name = f"run-{date}-dry-run.json" if dry_run else f"run-{date}.json"
+        state = cls(os.path.join(RUN_STATE_DIR, name) if RUN_STATE_DIR else None)
+        if not state.path:
+            return state
+        try:
+            with open(state.path, encoding="utf-8") as state_file:
+                data = json.load(state_file)
+        except (OSError, json.JSONDecodeError):
+            data = None
+        if resume:
+            if data is None:
+                print(f"No usable checkpoint at {state.path}, starting from scratch.")
+            else:
+                state.data = data
+                print(f"Resuming run from {state.path} (completed: {', '.join(state.data) or 'nothing'}).")
+        elif data:
+            # Starting over must not forget a post that already exists, or it would be posted twice
+            editions = {
+                name: {key: edition[key] for key in PUBLISH_STATE_KEYS if key in edition}
+                for name, edition in data.get('editions', {}).items()
+            }
+            editions = {name: kept for name, kept in editions.items() if kept}
+            if editions:
+                state.data = {'editions': editions}
+        return state
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def save(self, key, value):
+        self.data[key] = value
+        self.flush()
+
+    def edition(self, name):
+        return EditionState(self, name)
+
+    def flush(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".tmp", "w", encoding="utf-8") as state_file:
+                json.dump(self.data, state_file, separators=(",", ":"))
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            print(f"Warning: Could not save run state: {e}")
+
+class EditionState:
+    """
+    The part of a RunState that belongs to one edition, stored under "editions" in the same file.
+    """
+    def __init__(self, parent, name):
+        self.parent = parent
+        self.data = parent.data.setdefault('editions', {}).setdefault(name, {})
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def save(self, key, value):
+        self.data[key] = value
+        self.parent.flush()
+
+# --- Editions ---
+# By default a run produces one post from NEWS_COUNTRY. EDITIONS_CONFIG_PATH (or --editions) points at a
+# JSON file listing several editions instead, e.g.
+#   {"editions": [{"name": "us"}, {"name": "uk", "country": "gb", "exclude_topics": ["Sports"]},
+#                 {"name": "tech", "include_topics": ["Technology", "Science"], "topic_cap": 15, "tags": ["Tech"]}]}
+# Optional keys: country, include_topics, exclude_topics, topic_cap, other_cap, max_stories, newsletter, tags.
+# Every country is fetched once, every unique headline is classified once, and each edition then only
+# costs its own grouping, title, render and publish.
+EDITIONS_CONFIG_PATH = os.environ.get("EDITIONS_CONFIG_PATH", "")
+
+def load_editions(path):
+    """
+    Returns the list of editions to build, defaulting to a single edition for NEWS_COUNTRY.
+    """
+    if not path:
+        return [{'name': 'daily', 'country': NEWS_COUNTRY}]
+    try:
+        with open(path, encoding="utf-8") as config_file:
+            editions = json.load(config_file)['editions']
+    except (OSError, json.JSONDecodeError, KeyError, TypeError) as e:
+        raise ValueError(f"Could not load editions config '{path}': {e}")
+
+    names = [edition.get('name') for edition in editions]
+    if not editions or None in names or len(set(names)) != len(names):
+        raise ValueError(f"Editions in '{path}' each need a unique 'name'.")
+    for edition in editions:
+        edition.setdefault('country', NEWS_COUNTRY)
+    return editions
+
+def edition_output_path(output, edition, editions):
+    """
+    Where --dry-run writes an edition's HTML: the --output path itself for a single
+    edition, otherwise the path with the edition name added before the extension.
+    """
+    if len(editions) == 1:
+        return output
+    root, ext = os.path.splitext(output)
+    return f"{root}-{edition['name']}{ext}"
 
-publish_response = requests.put(publish_url, json=publish_data, headers=headers)
+def compact_article(article):
+    """
+    Keeps only the NewsAPI fields later steps use, so checkpoints stay small.
+    """
+    return {
+        'title': article.get('title') or "",
+        'url': article.get('url'),
+        'source': {'name': article.get('source', {}).get('name', 'Unknown Source')},
+        'publishedAt': article.get('publishedAt')
+    }
 
-if publish_response.status_code == 200:
-    res_json = publish_response.json()
-    post = res_json['posts'][0]
-    
-    # Check if email was actually triggered by inspecting the response
-    email_info = post.get('email')
-    if email_info:
-        print(f"Success! Post published. Email status: {email_info.get('status')} (Recipients: {email_info.get('recipient_count')})")
-    else:
-        print("Post published, but NO email object returned. Please check your Mailgun settings in Ghost Admin.")
-        
-    print(f"Post URL: {post.get('url')}")
-else:
-    print(f"Failed to publish/email: {publish_response.status_code} - {publish_response.text}")
+def run_pipeline(args):
+    """
+    Runs steps 1-2 once for every edition, then steps 2b-5 per edition, checkpointing
+    each one. Returns the process exit code.
+    """
+    editions = load_editions(getattr(args, 'editions', None) or EDITIONS_CONFIG_PATH)
+    state = RunState.for_today(resume=getattr(args, 'resume', False), dry_run=args.dry_run)
+    pending = [edition for edition in editions if not state.edition(edition['name']).get('published')]
+    if not pending:
+        print("Today's posts are already published. Nothing to do.")
+        return 0
+
+    # --- Step 1 --- every country the editions need, fetched concurrently
+    run_metrics.begin("fetch")
+    articles_by_country = state.get('articles')
+    if articles_by_country is None:
+        countries = list(dict.fromkeys(edition['country'] for edition in pending))
+        with ThreadPoolExecutor(max_workers=len(countries)) as pool:
+            fetched = dict(zip(countries, pool.map(get_top_headlines, countries)))
+
+        for country, articles in fetched.items():
+            print(f"Successfully fetched {len(articles)} headlines from NewsAPI.org for '{country}'.")
+        if not any(fetched.values()):
+            print("Error: Failed to fetch articles after retries. Exiting")
+            return 1
+        articles_by_country = {country: [compact_article(article) for article in articles] for country, articles in fetched.items()}
+        state.save('articles', articles_by_country)
+
+    # --- Step 2 --- filter each country's list, then classify every unique headline just once
+    candidates_by_country = state.get('candidates')
+    topics_by_headline = state.get('topics')
+    impacts_by_headline = state.get('impacts', {}) # Checkpoints from before impact scores have none
+    speculator = None
+    if topics_by_headline is None:
+        run_metrics.begin("filter")
+        candidates_by_country = {country: filter_articles(articles) for country, articles in articles_by_country.items()}
+
+        run_metrics.begin("classify")
+        unique_headlines = list(dict.fromkeys(
+            article_data['headline'] for candidates in candidates_by_country.values() for article_data in candidates
+        ))
+        # Headlines that could score highest go first, so classification can stop once no others could make it in
+        selectors = [StorySelector.for_edition(edition, candidates_by_country.get(edition['country'], [])) for edition in pending]
+        unique_headlines.sort(key=lambda headline: max(selector.bounds.get(headline, 0) for selector in selectors), reverse=True)
+        def enough(topics, impacts):
+            topics_so_far = dict(zip(unique_headlines, topics))
+            impacts_so_far = dict(zip(unique_headlines, impacts))
+            return all(selector.settled(topics_so_far, impacts_so_far) for selector in selectors)
+
+        # Titles for editions still to be titled start as soon as their top headlines are settled
+        speculator = TitleSpeculator(
+            [edition for edition in pending if state.edition(edition['name']).get('punny_title') is None],
+            candidates_by_country, unique_headlines
+        )
+        topics, impacts = get_news_topics(unique_headlines, on_labeled=speculator.update, enough=enough)
+        topics_by_headline = dict(zip(unique_headlines, topics))
+        impacts_by_headline = dict(zip(unique_headlines, impacts))
+        print("Classification complete.")
+        state.save('candidates', candidates_by_country)
+        state.save('topics', topics_by_headline)
+        state.save('impacts', impacts_by_headline)
+
+    # --- Steps 2b-5 --- per edition
+    exit_code = 0
+    try:
+        for edition in pending:
+            if len(editions) > 1:
+                print(f"--- Edition '{edition['name']}' ({edition['country']}) ---")
+            candidates = candidates_by_country.get(edition['country'], [])
+            if run_edition(edition, candidates, topics_by_headline, impacts_by_headline, state.edition(edition['name']), args, editions, speculator):
+                exit_code = 1
+    finally:
+        if speculator:
+            speculator.close()
+    return exit_code
+
+def run_edition(edition, candidates, topics_by_headline, impacts_by_headline, state, args, editions, speculator=None):
+    """
+    Groups, titles, renders and publishes one edition from the shared classification.
+    speculator holds titles already generated during classification, if there are any.
+    Returns the edition's exit code.
+    """
+    grouped_headlines = state.get('grouped_headlines')
+    if grouped_headlines is None:
+        run_metrics.begin("links")
+        grouped_headlines = select_headlines(edition, candidates, topics_by_headline, impacts_by_headline)
+        state.save('grouped_headlines', grouped_headlines)
+    if len(editions) > 1 and not any(grouped_headlines.values()):
+        print(f"Edition '{edition['name']}' has no headlines today, skipping it.")
+        return 0
+
+    # --- Step 3 ---
+    run_metrics.begin("title")
+    punny_title = state.get('punny_title')
+    if punny_title is None:
+        early_title = speculator.title(edition['name'], grouped_headlines) if speculator else None
+        punny_title = early_title or get_punny_title(grouped_headlines)
+        print(f"Punny title generated: '{punny_title}'")
+        state.save('punny_title', punny_title)
+
+    # --- Step 4 ---
+    run_metrics.begin("render")
+    html_content_for_ghost = state.get('html')
+    if html_content_for_ghost is None:
+        print("Generating modern HTML summary...")
+        html_content_for_ghost = create_html_summary(grouped_headlines)
+        print("HTML summary generated.")
+        state.save('html', html_content_for_ghost)
+
+    # --- Step 5 ---
+    if args.dry_run:
+        print("Dry run: not posting to Ghost.")
+        if args.output:
+            output_path = edition_output_path(args.output, edition, editions)
+            with open(output_path, "w", encoding="utf-8") as output_file:
+                output_file.write(html_content_for_ghost)
+            print(f"HTML written to {output_path}")
+        else:
+            print(f"Title: {punny_title}")
+            print(html_content_for_ghost)
+        return 0
+
+    if not post_to_ghost(punny_title, html_content_for_ghost, state, edition):
+        return 1
+    if state.get('published') and ARCHIVE_PATH:
+        get_archive().record(edition['name'], grouped_headlines, state.get('post_id'), datetime.date.today().isoformat())
+    return 0
+
+# --- Daemon mode ---
+# With --daemon the script stays running instead of doing everything in one burst before publishing.
+# It polls NewsAPI every DAEMON_POLL_INTERVAL seconds, classifies only headlines it hasn't seen yet and
+# keeps each edition's grouped headlines current in the day's checkpoint; the titles are written on the
+# last poll before DAEMON_PUBLISH_AT (local time, HH:MM), so publishing only pays for render and Ghost.
+DAEMON_POLL_INTERVAL = int(os.environ.get("DAEMON_POLL_INTERVAL", 3600)) # Seconds
+DAEMON_PUBLISH_AT = os.environ.get("DAEMON_PUBLISH_AT", "06:55")
+
+class NewsDaemon:
+    """
+    Resident scheduler. The warm candidate set lives in the RunState for the day being
+    built, so publishing is a resumed run_pipeline() that finds fetch, classify, grouping
+    and titles already done, and a restarted daemon picks up where it left off.
+    """
+    def __init__(self, args):
+        self.args = args
+        self.editions = load_editions(args.editions or EDITIONS_CONFIG_PATH)
+        try:
+            self.publish_at = datetime.datetime.strptime(DAEMON_PUBLISH_AT, "%H:%M").time()
+        except ValueError:
+            raise ValueError(f"DAEMON_PUBLISH_AT must be HH:MM, not '{DAEMON_PUBLISH_AT}'.")
+        self.day = None
+        self.state = None
+
+    def published(self):
+        """
+        True once every edition of the day is published, or skipped for having no headlines.
+        """
+        for edition in self.editions:
+            edition_state = self.state.edition(edition['name'])
+            grouped_headlines = edition_state.get('grouped_headlines')
+            skipped = len(self.editions) > 1 and grouped_headlines is not None and not any(grouped_headlines.values())
+            if not (edition_state.get('published') or skipped):
+                return False
+        return True
+
+    def start_day(self, day):
+        """
+        Switches to building the post for `day`, picking up any checkpoint already saved for it.
+        """
+        self.day = day
+        self.state = RunState.for_day(day, resume=True, dry_run=self.args.dry_run)
+        print(f"Daemon: building the post for {day.isoformat()}, publishing at {self.publish_time():%Y-%m-%d %H:%M}.")
+
+    def publish_time(self):
+        return datetime.datetime.combine(self.day, self.publish_at)
+
+    def poll(self):
+        """
+        Fetches the latest headlines, merges them into the day's articles and classifies the new ones.
+        """
+        run_metrics.begin("fetch")
+        articles_by_country = self.state.get('articles') or {}
+        countries = list(dict.fromkeys(edition['country'] for edition in self.editions))
+        with ThreadPoolExecutor(max_workers=len(countries)) as pool:
+            fetched = dict(zip(countries, pool.map(get_top_headlines, countries)))
+        for country, articles in fetched.items():
+            latest = [compact_article(article) for article in articles]
+            latest_urls = {article['url'] for article in latest}
+            known = articles_by_country.get(country, [])
+            new = len(latest_urls - {article['url'] for article in known})
+            print(f"Daemon: {len(latest)} headlines for '{country}', {new} new since the last poll.")
+            # The latest ranking comes first, followed by earlier stories that have since dropped out of it
+            articles_by_country[country] = latest + [article for article in known if article['url'] not in latest_urls]
+
+        # Filtering is local and cheap, so it runs over the whole day's set (dedup needs to see all of it)
+        run_metrics.begin("filter")
+        candidates_by_country = {country: filter_articles(articles) for country, articles in articles_by_country.items()}
+
+        run_metrics.begin("classify")
+        topics_by_headline = self.state.get('topics') or {}
+        impacts_by_headline = self.state.get('impacts') or {}
+        # Polls have time to spare, so they label everything, including headlines an earlier run skipped
+        unseen = list(dict.fromkeys(
+            article_data['headline'] for candidates in candidates_by_country.values()
+            for article_data in candidates if topics_by_headline.get(article_data['headline']) is None
+        ))
+        if unseen:
+            topics, impacts = get_news_topics(unseen)
+            topics_by_headline.update(zip(unseen, topics))
+            impacts_by_headline.update(zip(unseen, impacts))
+        print(f"Daemon: classified {len(unseen)} new headline(s), {len(topics_by_headline)} for this post so far.")
+
+        self.state.save('articles', articles_by_country)
+        self.state.save('candidates', candidates_by_country)
+        self.state.save('topics', topics_by_headline)
+        self.state.save('impacts', impacts_by_headline)
+        for edition in self.editions:
+            edition_state = self.state.edition(edition['name'])
+            if edition_state.get('publish_started'):
+                continue
+            run_metrics.begin("links")
+            grouped_headlines = select_headlines(edition, candidates_by_country.get(edition['country'], []), topics_by_headline, impacts_by_headline)
+            if grouped_headlines != edition_state.get('grouped_headlines'):
+                # A title or render of the old selection no longer matches it
+                edition_state.data.pop('punny_title', None)
+                edition_state.data.pop('html', None)
+                edition_state.save('grouped_headlines', grouped_headlines)
+
+    def prepare_titles(self):
+        """
+        Writes the titles ahead of publish time for editions whose selection has settled.
+        """
+        run_metrics.begin("title")
+        for edition in self.editions:
+            edition_state = self.state.edition(edition['name'])
+            grouped_headlines = edition_state.get('grouped_headlines')
+            if edition_state.get('publish_started') or edition_state.get('punny_title') or not grouped_headlines:
+                continue
+            if len(self.editions) > 1 and not any(grouped_headlines.values()):
+                continue
+            punny_title = get_punny_title(grouped_headlines)
+            print(f"Daemon: title for edition '{edition['name']}' ready: '{punny_title}'")
+            edition_state.save('punny_title', punny_title)
+
+    def publish(self):
+        """
+        Runs the resumed pipeline for the day. Returns True if the day's posts went out
+        (or, with --dry-run, were written).
+        """
+        global run_metrics
+        print(f"Daemon: publishing the post for {self.day.isoformat()}...")
+        args = argparse.Namespace(dry_run=self.args.dry_run, output=self.args.output, resume=True, editions=self.args.editions)
+        try:
+            exit_code = run_pipeline(args)
+        finally:
+            # One metrics report per published day
+            finish_run()
+            run_metrics = RunMetrics()
+        if self.args.dry_run:
+            return exit_code == 0
+        # The exit code alone can't tell a published post from a draft left behind, the checkpoint can
+        self.state = RunState.for_day(self.day, resume=True, dry_run=self.args.dry_run)
+        return self.published()
+
+    def run(self):
+        today = datetime.date.today()
+        self.start_day(today)
+        if self.published():
+            self.start_day(today + datetime.timedelta(days=1))
+        print(f"Daemon mode: polling every {DAEMON_POLL_INTERVAL}s, publishing daily at {DAEMON_PUBLISH_AT}.")
+
+        while True:
+            now = datetime.datetime.now()
+            if now.date() > self.day:
+                print(f"Daemon: could not publish the post for {self.day.isoformat()}, moving on.")
+                self.start_day(now.date())
+            try:
+                if now >= self.publish_time():
+                    if self.publish():
+                        self.start_day(self.day + datetime.timedelta(days=1))
+                    else:
+                        print(f"Daemon: publishing failed, trying again in {DAEMON_POLL_INTERVAL}s.")
+                else:
+                    self.poll()
+                    if (self.publish_time() - now).total_seconds() <= DAEMON_POLL_INTERVAL:
+                        self.prepare_titles()
+                    run_metrics.end()
+            except Exception as e:
+                # A bad poll shouldn't take the daemon down; the next one starts from the checkpoint
+                print(f"Daemon: error during {'publish' if now >= self.publish_time() else 'poll'}: {e}")
+
+            wake = datetime.datetime.now() + datetime.timedelta(seconds=DAEMON_POLL_INTERVAL)
+            if datetime.datetime.now() < self.publish_time() < wake:
+                wake = self.publish_time()
+            time.sleep(max(1, (wake - datetime.datetime.now()).total_seconds()))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch, classify and publish the Cow-Says Daily News.")
+    parser.add_argument("--dry-run", action="store_true", help="Build the post but don't touch Ghost.")
+    parser.add_argument("--output", help="With --dry-run, write the HTML to this file instead of printing it.")
+    parser.add_argument("--resume", action="store_true", help="Pick up today's run where it stopped, skipping finished steps.")
+    parser.add_argument("--editions", help="JSON file listing the editions to build (default: EDITIONS_CONFIG_PATH, or one edition).")
+    parser.add_argument("--daemon", action="store_true", help="Keep running: poll and classify through the day, publish at DAEMON_PUBLISH_AT.")
+    args = parser.parse_args(argv)
+
+    # Check every key this run needs before doing any work
+    required = ["NEWS_API_KEY", "GEMINI_API_KEY"]
+    if not args.dry_run:
+        required += ["ADMIN_API_KEY", "GHOST_URL", "GHOST_AUTHOR"]
+    for name in required:
+        require_env(name)
+
+    if args.daemon:
+        try:
+            return NewsDaemon(args).run()
+        except KeyboardInterrupt:
+            print("Daemon stopped. Today's progress is checkpointed and picked up on the next start.")
+            return 0
+    try:
+        return run_pipeline(args)
+    finally:
+        finish_run()
 
+if __name__ == "__main__":
+    sys.exit(main())
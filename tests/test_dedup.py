@@ -0,0 +1,53 @@
+"""
+Near-duplicate filter tests: the LSH index has to find the pairs DEDUP_SIMILARITY is meant to catch.
+
+    python -m unittest discover tests
+"""
+import importlib.util
+import os
+import random
+import unittest
+import unittest.mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_PATH = os.path.join(ROOT, "cowsays-daily-news.py")
+PAIRS = 2000
+
+
+def load_pipeline(env):
+    """
+    Imports a fresh copy of the pipeline script; settings are read at import, so `env` is only applied meanwhile.
+    """
+    with unittest.mock.patch.dict(os.environ, env):
+        spec = importlib.util.spec_from_file_location("cowsays_dedup_test", SCRIPT_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+class NearDuplicateIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pipeline = load_pipeline({})
+
+    def test_pairs_just_above_the_threshold_are_found(self):
+        # 8 shared words out of 12 in total is a Jaccard similarity of 0.67
+        rnd = random.Random(6)
+        missed = 0
+        for i in range(PAIRS):
+            words = [f"w{i}x{j}" for j in range(12)]
+            rnd.shuffle(words)
+            index = self.pipeline.NearDuplicateIndex(self.pipeline.DEDUP_SIMILARITY)
+            index.add(" ".join(words[:10]), i)
+            missed += index.find(" ".join(words[:8] + words[10:])) != i
+        self.assertLessEqual(missed, PAIRS * (1 - self.pipeline.NearDuplicateIndex.MIN_RECALL))
+
+    def test_unrelated_headlines_are_kept(self):
+        index = self.pipeline.NearDuplicateIndex(0.6)
+        index.add("Senate passes sweeping budget deal after late night vote", 1)
+        self.assertIsNone(index.find("Storm forces coastal evacuations across three states"))
+        self.assertEqual(index.find("Senate passes sweeping budget deal after late vote"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Link stage tests, run against the local news-site stand-in from benchmarks/stubs.py.
+
+    python -m unittest discover tests
+"""
+import base64
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+import unittest.mock
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import stubs
+
+SCRIPT_PATH = os.path.join(ROOT, "cowsays-daily-news.py")
+DEAD_RATE = 0.2
+REDIRECT_RATE = 0.3
+
+
+def load_pipeline(env):
+    """
+    Imports a fresh copy of the pipeline script; settings are read at import, so `env` is only applied meanwhile.
+    """
+    with unittest.mock.patch.dict(os.environ, env):
+        spec = importlib.util.spec_from_file_location("cowsays_links_test", SCRIPT_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+def find_url(path, low, high, query=""):
+    """
+    Returns a link the LinkServer puts in the [low, high) bucket: below DEAD_RATE is a 404,
+    then a 301 up to DEAD_RATE + REDIRECT_RATE, then a 200.
+    """
+    for i in range(10000):
+        url = f"http://news{i}.example/{path}"
+        if low <= bucket(url + query) < high:
+            return url
+    raise AssertionError(f"No link in bucket [{low}, {high})")
+
+
+def bucket(url):
+    return zlib.crc32(url.encode("utf-8")) % 1000 / 1000
+
+
+class LinkStageTest(unittest.TestCase):
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory(prefix="cowsays-links-")
+        self.addCleanup(work_dir.cleanup)
+        self.pipeline = load_pipeline({
+            'LINK_CHECK': "on", 'LINK_CACHE_PATH': os.path.join(work_dir.name, "links.sqlite3"),
+            'ARCHIVE_PATH': os.path.join(work_dir.name, "archive.sqlite3"), 'NOVELTY_MODE': "off",
+        })
+        self.service = stubs.ServiceModel(jitter=0)
+        self.server = stubs.LinkServer(self.service, dead_rate=DEAD_RATE, redirect_rate=REDIRECT_RATE).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.pipeline.get_link_session().proxies.update({'http': self.server.url})
+
+        self.dead = find_url("dead-story", 0, DEAD_RATE)
+        self.moved = find_url("moved-story", DEAD_RATE, DEAD_RATE + REDIRECT_RATE)
+        self.live = find_url("live-story", DEAD_RATE + REDIRECT_RATE, 1, query="?id=7")
+        self.other = find_url("other-story", DEAD_RATE + REDIRECT_RATE, 1)
+        articles = [
+            {'title': "Senate passes sweeping budget deal - Wire", 'url': self.dead, 'source': {'name': "Wire"}},
+            {'title': "Storm forces coastal evacuations - Daily", 'url': self.moved, 'source': {'name': "Daily"}},
+            {'title': "Chipmaker shares climb on earnings - Ledger", 'url': self.live + "?utm_medium=email&id=7&fbclid=abc", 'source': {'name': "Ledger"}},
+            {'title': "Vaccine study reports strong results - Journal", 'url': self.other + "?utm_source=feed", 'source': {'name': "Journal"}},
+        ]
+        self.candidates = self.pipeline.filter_articles(articles)
+        self.topics = {article_data['headline']: "Business" for article_data in self.candidates}
+
+    def select(self):
+        grouped_headlines = self.pipeline.select_headlines({'max_stories': 3}, self.candidates, self.topics, {})
+        return [article_data['url'] for article_data in grouped_headlines["Business"]]
+
+    def test_tracking_parameters_are_stripped(self):
+        self.assertEqual(self.candidates[3]['url'], self.other)
+        self.assertEqual(self.candidates[2]['url'], self.live + "?id=7")
+
+    def test_dead_link_is_replaced(self):
+        urls = self.select()
+        self.assertEqual(len(urls), 3)
+        self.assertNotIn(self.dead, urls)
+        self.assertIn(self.other, urls)
+
+    def test_redirect_resolves_to_canonical_address(self):
+        # The stand-in redirects to /landing with utm_* parameters added
+        self.assertIn(self.moved + "/landing", self.select())
+
+    def test_link_as_given_is_tried_when_the_cleaned_up_one_is_dead(self):
+        for i in range(10000):
+            broken = f"http://news{i}.example/broken-story"
+            if bucket(broken) < DEAD_RATE and bucket(broken + "?utm_campaign=daily") >= DEAD_RATE + REDIRECT_RATE:
+                break
+        candidates = self.pipeline.filter_articles([
+            {'title': "Court rules on landmark case - Herald", 'url': broken + "?utm_campaign=daily", 'source': {'name': "Herald"}},
+        ])
+        grouped_headlines = self.pipeline.select_headlines({'max_stories': 3}, candidates, {candidates[0]['headline']: "Politics"}, {})
+        self.assertEqual(candidates[0]['url'], broken)
+        self.assertEqual(grouped_headlines["Politics"], [
+            {'headline': "Court rules on landmark case", 'source': "Herald", 'url': broken + "?utm_campaign=daily", 'published_at': None}
+        ])
+
+    def test_cached_links_are_not_checked_again(self):
+        first = self.select()
+        calls = self.service.calls
+        self.assertGreater(calls, 0)
+        self.assertEqual(self.select(), first)
+        self.assertEqual(self.service.calls, calls)
+
+
+class CanonicalizeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.canonicalize_url = staticmethod(load_pipeline({}).canonicalize_url)
+
+    def test_google_redirect_is_unwrapped_only_on_google(self):
+        self.assertEqual(self.canonicalize_url("https://www.google.com/url?q=https://example.com/a&sa=D"), "https://example.com/a")
+        self.assertEqual(self.canonicalize_url("https://notgoogle.com/url?q=https://example.com/a"), "https://notgoogle.com/url?q=https://example.com/a")
+
+    def test_query_is_kept_as_written(self):
+        self.assertEqual(self.canonicalize_url("https://example.com/story.php?123456"), "https://example.com/story.php?123456")
+        self.assertEqual(self.canonicalize_url("https://example.com/a?x=1;y=2&utm_source=rss"), "https://example.com/a?x=1;y=2")
+        self.assertEqual(self.canonicalize_url("https://example.com/a?q=a%20b&fbclid=abc&page=2"), "https://example.com/a?q=a%20b&page=2")
+
+    def test_amp_paths_are_only_rewritten_on_amp_hosts(self):
+        self.assertEqual(self.canonicalize_url("https://example.com/amp/2024/10/story"), "https://example.com/amp/2024/10/story")
+        self.assertEqual(self.canonicalize_url("https://www.cnbc.com/amp/2024/10/16/story.html"), "https://www.cnbc.com/2024/10/16/story.html")
+
+    def test_google_news_article_is_unwrapped(self):
+        url = b"https://example.com/world/story.html?utm_source=googlenews"
+        article_id = base64.urlsafe_b64encode(b"\x08\x13\x22" + bytes([len(url)]) + url + b"\xd2\x01\x00").decode().rstrip("=")
+        self.assertEqual(self.canonicalize_url(f"https://news.google.com/rss/articles/{article_id}?oc=5"), "https://example.com/world/story.html")
+
+    def test_opaque_google_news_article_is_kept(self):
+        url = "https://news.google.com/rss/articles/CBMiAU_yqLNotDecodableOffline?oc=5"
+        self.assertEqual(self.canonicalize_url(url), url)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Checkpoint tests: the day's run state must never lose track of a post that is already on Ghost.
+
+    python -m unittest discover tests
+"""
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_PATH = os.path.join(ROOT, "cowsays-daily-news.py")
+
+ARTICLES = [
+    {'title': "Senate passes sweeping budget deal - Wire", 'url': "https://wire.example/budget", 'source': {'name': "Wire"}},
+    {'title': "Chipmaker shares climb on earnings - Ledger", 'url': "https://ledger.example/chips", 'source': {'name': "Ledger"}},
+]
+
+
+def load_pipeline(env):
+    """
+    Imports a fresh copy of the pipeline script; settings are read at import, so `env` is only applied meanwhile.
+    """
+    with unittest.mock.patch.dict(os.environ, env):
+        spec = importlib.util.spec_from_file_location("cowsays_run_state_test", SCRIPT_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+class RunStateTest(unittest.TestCase):
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory(prefix="cowsays-runs-")
+        self.addCleanup(work_dir.cleanup)
+        self.state_dir = os.path.join(work_dir.name, "runs")
+        self.pipeline = load_pipeline({
+            'RUN_STATE_DIR': self.state_dir, 'EDITIONS_CONFIG_PATH': "", 'LINK_CHECK': "off", 'NOVELTY_MODE': "off",
+            'ARCHIVE_PATH': "", 'CLASSIFY_CACHE_PATH': "", 'LABEL_LOG_PATH': "",
+        })
+        self.fetches = 0
+        def get_top_headlines(country):
+            self.fetches += 1
+            return ARTICLES
+        self.pipeline.get_top_headlines = get_top_headlines
+        self.pipeline.get_news_topics = lambda headlines, on_labeled=None, enough=None: (["Business"] * len(headlines), [3] * len(headlines))
+        self.pipeline.get_punny_title = lambda grouped_headlines: "Moo-ving Markets"
+        self.path = os.path.join(self.state_dir, f"run-{datetime.date.today().isoformat()}.json")
+
+    def seed(self, data):
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as state_file:
+            json.dump(data, state_file)
+
+    def checkpoint(self):
+        with open(self.path, encoding="utf-8") as state_file:
+            return json.load(state_file)
+
+    def run_pipeline(self, dry_run, resume=False):
+        args = argparse.Namespace(dry_run=dry_run, output=os.devnull, resume=resume, editions=None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.pipeline.run_pipeline(args)
+
+    def test_dry_run_leaves_the_checkpoint_alone(self):
+        seeded = {'editions': {'daily': {'published': True, 'post_id': "abc"}}}
+        self.seed(seeded)
+        self.assertEqual(self.run_pipeline(dry_run=True), 0)
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(self.checkpoint(), seeded)
+        self.assertTrue(os.path.exists(self.path.replace(".json", "-dry-run.json")))
+
+    def test_fresh_run_keeps_the_posts_on_ghost(self):
+        self.seed({
+            'articles': {'us': ARTICLES},
+            'editions': {
+                'daily': {'publish_started': True, 'post_id': "abc", 'punny_title': "Old title"},
+                'uk': {'punny_title': "Never posted"},
+            },
+        })
+        with contextlib.redirect_stdout(io.StringIO()):
+            state = self.pipeline.RunState.for_today(resume=False)
+        self.assertEqual(state.data, {'editions': {'daily': {'publish_started': True, 'post_id': "abc"}}})
+
+    def test_published_day_is_not_posted_again_without_resume(self):
+        self.seed({'editions': {'daily': {'published': True, 'post_id': "abc"}}})
+        self.assertEqual(self.run_pipeline(dry_run=False), 0)
+        self.assertEqual(self.fetches, 0)
+        self.assertEqual(self.checkpoint()['editions']['daily'], {'published': True, 'post_id': "abc"})
+
+
+if __name__ == "__main__":
+    unittest.main()